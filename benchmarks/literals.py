@@ -0,0 +1,41 @@
+"""Inference time of large literal tables.
+
+    python benchmarks/literals.py [-n 50000]
+
+Each table is a single assignment of a generated list, dict or set
+literal with n elements.
+"""
+import ast
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from penathon.Inferer import Inferer
+
+TABLES = {
+    "ints": lambda n: "[" + ", ".join(str(i) for i in range(n)) + "]",
+    "dict": lambda n: "{" + ", ".join(f"{i}: 'v{i}'" for i in range(n)) + "}",
+    "rows": lambda n: "[" + ", ".join(f"({i}, 'a', {i}.5)" for i in range(n)) + "]",
+    "nested": lambda n: "[" + ", ".join(f"[{i}, [{i}.0, None]]" for i in range(n)) + "]",
+    "mixed set": lambda n: "{" + ", ".join(f"'{i}'" if i % 2 else f"b'{i}'" for i in range(n)) + "}",
+}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-n", type=int, default=50000, help="elements per table")
+    args = parser.parse_args()
+
+    Inferer().infer(ast.parse("x = [1]\n"))  # load the stubs
+    for name, table in TABLES.items():
+        tree = ast.parse(f"x = {table(args.n)}\n")
+        start = time.perf_counter()
+        Inferer().infer(tree)
+        print(f"{name:>9}: {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
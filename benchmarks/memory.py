@@ -0,0 +1,78 @@
+"""Memory used by inference on one input.
+
+    python benchmarks/memory.py [samples/test_grammar.py]
+
+Stubs are loaded by a first run, so the numbers only cover the
+TypeWrapper/SymTable objects and type terms of the measured run.
+"""
+import ast
+import gc
+import os
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from penathon.Inferer import Inferer
+from penathon.CodeGenerator import CodeGenerator
+from penathon.SymTable import SymTable
+from penathon.TypeWrapper import TypeWrapper
+
+
+def run(tree):
+    symbol_table = Inferer().infer(tree)
+    return CodeGenerator().gen(tree, symbol_table), symbol_table
+
+
+def count(cls):
+    return sum(1 for o in gc.get_objects() if isinstance(o, cls))
+
+
+def count_allocations(cls):
+    counter = [0]
+    init = cls.__init__
+
+    def counting_init(self, *args, **kwargs):
+        counter[0] += 1
+        init(self, *args, **kwargs)
+
+    cls.__init__ = counting_init
+    return counter
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("input", nargs="?", default="samples/test_grammar.py")
+    args = parser.parse_args()
+    with open(args.input) as f:
+        source = f.read()
+    sys.setrecursionlimit(10000)
+    run(ast.parse(source))  # load the stubs
+    tree = ast.parse(source)
+
+    gc.collect()
+    allocated = count_allocations(TypeWrapper)
+    tracemalloc.start()
+    result = run(tree)
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    wrappers = sum(
+        stat.size
+        for stat in snapshot.statistics("filename")
+        if os.path.basename(stat.traceback[0].filename) in ("TypeWrapper.py", "SymTable.py")
+    )
+
+    wrapper = TypeWrapper(None)
+    size = sys.getsizeof(wrapper)
+    if hasattr(wrapper, "__dict__"):
+        size += sys.getsizeof(wrapper.__dict__)
+    print(f"TypeWrapper size: {size} bytes")
+    print(f"TypeWrapper allocated: {allocated[0]}, live: {count(TypeWrapper)}, live SymTable: {count(SymTable)}")
+    print(f"held by TypeWrapper.py/SymTable.py: {wrappers / 1024:.1f} KiB")
+    print(f"retained: {current / 1024:.1f} KiB, peak: {peak / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Inference of deeply nested generated code, recursive vs iterative.
+
+    python benchmarks/nesting.py [-n 2000]
+
+Each module nests n nodes: an elif chain or a sum of n names. Names the
+recursive engine drops are statements it gave up on at the recursion
+limit.
+"""
+import ast
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from penathon.Inferer import Inferer
+
+MODULES = {
+    "elif": lambda n: "a = 1\nif a == 0:\n    y0 = 0\n"
+                      + "".join(f"elif a == {i}:\n    y{i} = {i}.5\n" for i in range(1, n)),
+    "sum": lambda n: "a = 1\nx = " + " + ".join(["a"] * n) + "\n",
+}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-n", type=int, default=2000, help="nesting depth")
+    args = parser.parse_args()
+
+    Inferer().infer(ast.parse("x = [1]\n"))  # load the stubs
+    for name, module in MODULES.items():
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 10 * args.n))  # for ast.parse only
+        tree = ast.parse(module(args.n))
+        sys.setrecursionlimit(limit)
+        for iterative in (False, True):
+            start = time.perf_counter()
+            env = Inferer(iterative=iterative).infer(tree)
+            seconds = time.perf_counter() - start
+            engine = "iterative" if iterative else "recursive"
+            print(f"{name:>4} {engine:>9}: {seconds * 1e3:8.1f} ms, {len(env.env)} names")
+
+
+if __name__ == "__main__":
+    main()
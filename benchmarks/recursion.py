@@ -0,0 +1,61 @@
+"""Inference time of recursive functions.
+
+    python benchmarks/recursion.py [-n 200]
+
+Each module defines n functions of one recursive shape, called once.
+"""
+import ast
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from penathon.Inferer import Inferer
+
+SHAPES = {
+    "self": lambda i: (
+        f"def fib{i}(x):\n"
+        f"    if x < 2:\n"
+        f"        return 1\n"
+        f"    return fib{i}(x - 1) + fib{i}(x - 2)\n"
+        f"y{i} = fib{i}(10)\n"
+    ),
+    "mutual": lambda i: (
+        f"def even{i}(n):\n"
+        f"    if n == 0:\n"
+        f"        return True\n"
+        f"    return odd{i}(n - 1)\n"
+        f"def odd{i}(n):\n"
+        f"    if n == 0:\n"
+        f"        return False\n"
+        f"    return even{i}(n - 1)\n"
+        f"y{i} = even{i}(3)\n"
+    ),
+    "method": lambda i: (
+        f"class Node{i}:\n"
+        f"    def depth(self, n):\n"
+        f"        if n == 0:\n"
+        f"            return 0\n"
+        f"        return self.depth(n - 1) + 1\n"
+        f"y{i} = Node{i}().depth(4)\n"
+    ),
+}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-n", type=int, default=200, help="functions per module")
+    args = parser.parse_args()
+
+    Inferer().infer(ast.parse("x = [1]\n"))  # load the stubs
+    for name, shape in SHAPES.items():
+        tree = ast.parse("".join(shape(i) for i in range(args.n)))
+        start = time.perf_counter()
+        Inferer().infer(tree)
+        print(f"{name:>6}: {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,75 @@
 import ast
 import copy
+import sys
 import astor
 import typing
 from argparse import ArgumentParser
 from penathon.Inferer import Inferer
 from penathon.CodeGenerator import CodeGenerator
+from penathon.Typer import stub_cache, WARM_MODULES
+from penathon import Subtype
 
 
 def main():
     parser = ArgumentParser()
-    parser.add_argument("input", help="input file")
+    parser.add_argument("input", nargs="?", help="input file")
+    parser.add_argument(
+        "--build-index",
+        action="store_true",
+        help="precompile typeshed stubs into an on-disk index and exit",
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="pre-parse common typeshed modules in a process pool first",
+    )
+    parser.add_argument(
+        "--warm-modules",
+        default=",".join(WARM_MODULES),
+        metavar="MODULES",
+        help="comma separated typeshed modules pre-parsed by --warm",
+    )
+    parser.add_argument(
+        "--union-width",
+        type=int,
+        default=Subtype.UNION_WIDTH,
+        metavar="N",
+        help="widen inferred unions of more than N types to a common supertype",
+    )
+    parser.add_argument(
+        "--iterative",
+        action="store_true",
+        help="infer nested code with an explicit stack instead of recursion, "
+        "for generated modules nesting thousands of nodes deep",
+    )
+    parser.add_argument(
+        "--diagnostics",
+        action="store_true",
+        help="report the statements inference gave up on to stderr",
+    )
     args = parser.parse_args()
+    if args.build_index:
+        count = stub_cache.build_index()
+        print(f"indexed {count} stubs into {stub_cache.index_file}", file=sys.stderr)
+        return
+    if args.input is None:
+        parser.error("the following arguments are required: input")
     input_file = args.input
+    Subtype.UNION_WIDTH = args.union_width
+    if args.warm:
+        stub_cache.warm(args.warm_modules.split(","))
+    if args.iterative:
+        # parsing and writing the annotated source still recurse
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
     with open(input_file) as f:
         x = ast.parse(f.read())
 
-    inferer = Inferer()
+    inferer = Inferer(iterative=args.iterative)
     cg = CodeGenerator()
     symbol_table = inferer.infer(x)
+    if args.diagnostics:
+        for d in sorted(inferer.diagnostics, key=lambda d: (d.lineno or 0, d.col_offset or 0)):
+            print(f"{input_file}:{d.lineno}:{(d.col_offset or 0) + 1}: {d.message}", file=sys.stderr)
     # symbol_table.print()
     tree_with_type = cg.gen(x, symbol_table)
     # print('-----')
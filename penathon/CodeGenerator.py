@@ -2,6 +2,7 @@ import ast
 import astor
 from typing import TypeVar, Union, Callable, List
 from copy import deepcopy
+from . import TypeTerm
 from .TypeWrapper import TypeWrapper
 
 class CodeGenerator(ast.NodeTransformer):
@@ -53,27 +54,36 @@ class CodeGenerator(ast.NodeTransformer):
         return body
 
     def visit_FunctionDef(self, node):
-        t = self.get_real_type(self.search(node.name))
+        if node not in self.symbol_table.childs: # not inferred, e.g. inside an async def
+            return node
+        body_table = self.symbol_table.childs[node]
+        t = self.get_real_type(body_table.function)
         if t is None:
             return node
 
         args_type = list(t.__args__[:-1])
         body_type = t.__args__[-1]
-        args_enum = enumerate(args_type, 1) if self.cur_class else enumerate(args_type)
+        params = node.args.args[1:] if self.cur_class else node.args.args
 
-        for i, arg in args_enum:
-            node.args.args[i].annotation = self.get_type_name(arg)
-        node.returns = self.get_type_name(body_type)
+        if len(params) == len(args_type):
+            for param, arg in zip(params, args_type):
+                param.annotation = self.get_type_name(arg)
+            node.returns = self.get_type_name(body_type)
 
-        self.symbol_table = self.symbol_table.childs[node.name]
+        self.symbol_table = body_table
+        cur_class_bak = self.cur_class
+        self.cur_class = None # functions nested in a method are no methods
 
         ast.NodeTransformer.generic_visit(self, node)
 
+        self.cur_class = cur_class_bak
         self.symbol_table = self.symbol_table.parent
 
         return node
 
     def visit_ClassDef(self, node):
+        if node.name not in self.symbol_table.childs: # its definition failed
+            return node
         self.symbol_table = self.symbol_table.childs[node.name]
 
         cur_class_bak = self.cur_class
@@ -98,7 +108,8 @@ class CodeGenerator(ast.NodeTransformer):
         return self.symbol_table.typeof(name)
 
     def get_real_type(self, wrapped_type):
-        return TypeWrapper.reveal_type_var(wrapped_type.reveal())
+        # typing objects are only built here, for the annotations
+        return TypeTerm.to_typing(TypeWrapper.reveal_type_var(wrapped_type.summary()))
 
     def get_type_name(self, t):
         # built-in type
@@ -0,0 +1,65 @@
+"""Inference failures, as node results and as reported diagnostics."""
+from . import TypeTerm
+from .TypeWrapper import TypeWrapper
+
+
+class Diagnostic:
+    """Why a node could not be inferred, returned by a handler instead of raising."""
+
+    __slots__ = ("node", "fmt", "args", "text")
+
+    def __init__(self, node, fmt, *args):
+        self.node = node
+        self.fmt = fmt
+        self.args = args
+        self.text = None
+
+    @property
+    def lineno(self):
+        return getattr(self.node, "lineno", None)
+
+    @property
+    def col_offset(self):
+        return getattr(self.node, "col_offset", None)
+
+    @property
+    def message(self):
+        self.format()
+        return self.text
+
+    def format(self):
+        """Fix the message once the diagnostic is recorded: bindings made
+        later must not change the types it shows."""
+        if self.text is None:
+            self.text = self.fmt.format(*(_show(a) for a in self.args))
+
+    @classmethod
+    def of(cls, node, exc):
+        """Diagnostic of exc, raised while inferring node."""
+        if isinstance(exc, InferenceError):
+            return exc.diagnostic
+        return cls(node, "{}", exc)
+
+    def exception(self):
+        """The exception to raise for it, e.g. in DEBUG mode."""
+        return InferenceError(self)
+
+    def __repr__(self):
+        return f"<Diagnostic {self.lineno}:{self.col_offset} {self.message}>"
+
+
+def _show(arg):
+    # types as they are annotated, an unbound variable is Any
+    if isinstance(arg, TypeWrapper):
+        arg = arg.reveal()
+    if isinstance(arg, TypeTerm.Term):
+        return TypeTerm.to_typing(TypeWrapper.reveal_type_var(arg))
+    return arg
+
+
+class InferenceError(Exception):
+    """A Diagnostic raised where no result can carry it."""
+
+    def __init__(self, diagnostic):
+        super().__init__(f"{diagnostic.lineno}: {diagnostic.message}")
+        self.diagnostic = diagnostic
@@ -1,454 +1,768 @@
 import ast
 import copy
 import builtins
+from types import GeneratorType
 from typing import Dict, List, Set, Tuple, Union, Callable, TypeVar, Any
 
-from .TypeWrapper import TypeWrapper
+from . import Subtype, TypeTerm
+from .TypeWrapper import Scheme, TypeWrapper
 from .Constant import BASIC_TYPES
+from .Diagnostic import Diagnostic, InferenceError
 from .SymTable import SymTable
 
 DEBUG = False
 
+# passes over the bodies of recursive functions, see Inferer.infer_group
+FIXPOINT_ITERATIONS = 8
+
+class Catch:
+    """Yielded by a handler for a child whose Diagnostic it takes itself."""
+
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+
 class Inferer:
-    def __init__(self):
+    # nodes that are accepted but not inferred (yet)
+    IGNORED_NODES = (
+        ast.AsyncFunctionDef, ast.Delete, ast.AugAssign, ast.AnnAssign,
+        ast.AsyncFor, ast.AsyncWith, ast.Raise, ast.Assert,
+        ast.Pass, ast.Break, ast.Continue,
+        ast.IfExp, ast.Await, ast.Yield, ast.YieldFrom,
+        ast.FormattedValue, ast.JoinedStr, ast.Starred,
+    )
+
+    # literals whose type follows from their elements, see literal_shape()
+    LITERAL_NODES = (ast.List, ast.Set, ast.Tuple, ast.Dict)
+
+    def __init__(self, iterative=False):
         self.env = SymTable('root')
         self.func_ret_type = []
+        self.func_calls = None # calls of the function being inferred, see record_call
         self.cur_class = None
+        self.cur_function = None # function whose body is being inferred
+        self.functions = [] # user functions, in order of definition
+        self.diagnostics = [] # Diagnostic of every statement given up on
+        self.owner = {} # entry of functions or diagnostics -> cur_function adding it
+        # iterative: nested nodes are walked with an explicit stack instead
+        # of Python recursion, for generated code nesting thousands deep
+        self.run = self.run_stack if iterative else self.run_nested
 
     def infer(self, tree):
         self.infer_body(tree)
+        self.infer_uncalled()
         return self.env
 
-    def infer_body(self, e):
-        for i in e.body:
+    def infer_uncalled(self):
+        # functions no code path calls still get annotated; defining them
+        # may define more (nested functions)
+        i = 0
+        while i < len(self.functions):
+            func_type = self.functions[i]
+            i += 1
+            if func_type.lazy_func_info is None:
+                continue
             if DEBUG:
-                self.infer_stmt(i)
+                self.lazy_func_load(func_type)
             else:
+                tree = func_type.lazy_func_info['tree']
                 try:
-                    self.infer_stmt(i)
-                except:
-                    continue
-
-
-    def infer_stmt(self, e):
-        if isinstance(e, ast.FunctionDef):
-            self.env.add(e.name, TypeWrapper(None, lazy_func_info={
-                'tree': e,
-                'env': self.env,
-                'cur_class': self.cur_class,
-            }))
-
-        elif isinstance(e, ast.AsyncFunctionDef):
-            pass
-
-        elif isinstance(e, ast.ClassDef):
-            newSymTable = SymTable(e.name, self.env)
-            self.env = newSymTable
-
-            cur_class_bak = self.cur_class
-            classType = TypeWrapper(self.env.env, e.name)
-            self.cur_class = classType
-
-            self.infer_body(e)
-
-            # restore context
-            self.cur_class = cur_class_bak
-            self.env = self.env.parent
-            self.env.add(e.name, classType)
-
-        elif isinstance(e, ast.Return):
-            valueType = self.infer_expr(e.value)
-            self.func_ret_type.append(TypeWrapper.reveal_type_var(valueType.reveal()))
-
-        elif isinstance(e, ast.Delete):
-            pass
+                    self.lazy_func_load(func_type)
+                except Exception as exc:
+                    diagnostic = Diagnostic.of(tree, exc)
+                    diagnostic.format()
+                    self.diagnostics.append(diagnostic)
 
-        elif isinstance(e, ast.Assign):
-            valueType = self.infer_expr(e.value)
-            for t in e.targets:
-                if isinstance(t, ast.Subscript):
-                    continue
-                else:
-                    env, name = self.infer_expr(t)
-                    if name not in env:
-                        env[name] = valueType
-
-        elif isinstance(e, ast.AugAssign):
-            pass
-
-        elif isinstance(e, ast.AnnAssign):
-            pass
-
-        elif isinstance(e, ast.For):
-            env, target = self.infer_expr(e.target)
-            if target in env:
-                raise Exception(f"{target} already has type {env[target].reveal()}")
+    def infer_body(self, e):
+        return self.run(self.statements(e.body))
 
+    def statements(self, body):
+        # a statement that fails is skipped, and recorded in diagnostics
+        for i in body:
+            if DEBUG:
+                result = yield Catch(i)
+                if type(result) is Diagnostic:
+                    raise result.exception()
+                continue
             try:
-                iter = self.infer_expr(e.iter).typeof("__iter__").reveal()
-                if not TypeWrapper.is_Callable(iter):
-                    raise Exception("__iter__ is not callable")
-                iter_type = TypeWrapper.get_callable_ret(iter) # typing.Iterator[T]
-                item_type = TypeWrapper.get_arg(iter_type)[0]
-                env[target] = TypeWrapper(item_type)
-            except:            
-                env[target] = TypeWrapper(Any)
-
-            self.infer_body(e)
-
-            for n in e.orelse:
-                self.infer_stmt(n)
-
-        elif isinstance(e, ast.AsyncFor):
-            pass
-
-        elif isinstance(e, ast.While):
-            self.infer_expr(e.test)
-
-            self.infer_body(e)
-
-            for i in e.orelse:
-                self.infer_stmt(i)
-
-        elif isinstance(e, ast.If):
-            self.infer_expr(e.test)
-
-            self.infer_body(e)
-
-            for i in e.orelse:
-                self.infer_stmt(i)
-
-        elif isinstance(e, ast.With):
-            for i in e.items:
-                contextType = self.infer_expr(i.context_expr)
-                if i.optional_vars:
-                    env, name = self.infer_expr(i.optional_vars)
-                    env[name] = contextType
-
-            self.infer_body(e)
-
-        elif isinstance(e, ast.AsyncWith):
-            pass
-
-        elif isinstance(e, ast.Raise):
-            pass
-
-        elif isinstance(e, ast.Try):
-            self.infer_body(e)
-
-            for i in e.handlers:
-                self.infer_body(i)
-
-            for i in e.finalbody:
-                self.infer_stmt(i)
-
-        elif isinstance(e, ast.Assert):
-            pass
-
-        elif isinstance(e, ast.Import):
-            for n in e.names:
-                module_name = n.name
-                self.env.add_module(module_name, n.asname)
-
-        elif isinstance(e, ast.ImportFrom):
-            for n in e.names:
-                module_name = f"{e.module}"
-                self.env.add_module(module_name, n.asname, target=n.name)
-
-        elif isinstance(e, ast.Global):
-            env = self.env
-            while env.parent is not None:
-                env = env.parent
-
-            for i in e.names:
-                if i in self.env.env:
-                    raise Exception(f"{i} is assigned to before global declaration")
-                self.env.add(i, env.typeof(i))
-
-        elif isinstance(e, ast.Nonlocal):
-            if self.env.parent is None:
-                raise Exception("nonlocal declaration not allowed at module level")
-            env = self.env.parent
-            if env.parent is None:
-                raise Exception(f"no binding for nonlocal {e.names[0]} found")
-
-            for i in e.names:
-                if i not in env.env:
-                    raise Exception(f"no binding for nonlocal {i} found")
-                self.env.add(i, env.typeof(i))
-
-        elif isinstance(e, ast.Expr):
-            return self.infer_expr(e.value)
-
-        elif isinstance(e, ast.Pass):
-            pass
-
-        elif isinstance(e, ast.Break):
-            pass
-
-        elif isinstance(e, ast.Continue):
-            pass
-
-        else:
-            raise Exception(f"{e.lineno}: Unsupported syntax")
+                result = yield Catch(i)
+            except Exception as exc:
+                result = Diagnostic.of(i, exc)
+            if type(result) is Diagnostic:
+                if result.lineno is None:
+                    result.node = i
+                result.format()
+                self.diagnostics.append(result)
+                self.owner[result] = self.cur_function
 
     def infer_expr(self, e):
-        if isinstance(e, ast.BoolOp):
-            for v in e.values:
-                self.infer_expr(v) # ignore return
-
-            bool_inst = self.env.typeof('bool')
-            return bool_inst
-
-        # elif isinstance(e, ast.NamedExpr):
-        #     pass
-
-        elif isinstance(e, ast.BinOp):
-            leftType = self.infer_expr(e.left)
-            rightType = self.infer_expr(e.right)
-
-            # backup for error restore used
-            leftOriType = leftType.type
-            leftOriClass = leftType.class_name
-            rightOriType = rightType.type
-            rightOriClass = rightType.class_name
-
-            # promote type if can coerce
-            if leftType.can_coerce(rightType):
-                leftType.type = rightType.type
-                leftType.class_name = rightType.class_name
-            elif rightType.can_coerce(leftType):
-                rightType.type = leftType.type
-                rightType.class_name = leftType.class_name
-
-            def do(a, op_func, b):
-                argList = [b.reveal()]
-                resultType = TypeWrapper.new_type_var().reveal()
-                callType = TypeWrapper(Callable[argList, resultType])
-                funcType = a.typeof(op_func)
-                self.unify_function(callType, funcType)
-
-            try: # left op
-                do(leftType, self._get_magic(e.op, reverse=False), rightType)
-                return leftType
-            except: # right op
+        try:
+            handler = self.handlers[type(e)]
+        except KeyError:
+            handler = self.handler_for(type(e))
+        result = handler(self, e)
+        if type(result) is GeneratorType:
+            return self.run(result)
+        return result
+
+    infer_stmt = infer_expr # statements dispatch through the same table
+
+    # Handlers of nodes with children are generators: they yield a child
+    # node and are sent its inferred type back, or thrown the exception
+    # inferring it raised. A handler fails by returning a Diagnostic: the
+    # handlers waiting on it are abandoned, up to one that yielded
+    # Catch(child) and is sent the Diagnostic. run_nested() infers the
+    # child by recursion, run_stack() pushes the child's own steps on a
+    # stack, so both infer the same nodes in the same order.
+    def run_nested(self, steps):
+        # dispatches inline, so a nesting level costs a single frame
+        handlers = self.handlers
+        send, value = steps.send, None
+        while True:
+            try:
+                node = send(value)
+            except StopIteration as stop:
+                return stop.value
+            catch = type(node) is Catch
+            if catch:
+                node = node.node
+            try:
                 try:
-                    do(rightType, self._get_magic(e.op, reverse=True), leftType)
-                    return rightType
-                except:
-                    leftType.type = leftOriType
-                    leftType.class_name = leftOriClass
-                    rightType.type = rightOriType
-                    rightType.class_name = rightOriClass
-                    raise Exception(f"BinOp failed: {leftType.reveal()} {type(e.op).__name__} {rightType.reveal()}")
-
-        elif isinstance(e, ast.UnaryOp):
-            # TODO: Invert | Not | UAdd | USub, check magic function
-            return self.infer_expr(e.operand)
-
-        elif isinstance(e, ast.Lambda):
-            env_bak = self.env
-            self.env = SymTable(None, None)
-
-            # create type variables for each argument
-            argList = list()
-            for i in e.args.args:
-                argName = i.arg
-                argTypeVar = TypeWrapper.new_type_var()
-                self.env.add(argName, argTypeVar)
-                argList.append(argTypeVar.reveal())
-
-            # generate body type
-            bodyType = self.infer_expr(e.body).reveal()
-            inferredType = TypeWrapper(Callable[argList, bodyType])
-
-            # context switch back
-            self.env = env_bak
-
-            return inferredType
-
-        elif isinstance(e, ast.IfExp):
-            pass
-
-        elif isinstance(e, ast.Dict):
-            dict_class_inst = self.env.typeof('dict')
-            key_type = []
-            value_type = []
-            for i in range(len(e.keys)):
-                key_type.append(self.infer_expr(e.keys[i]).reveal())
-                value_type.append(self.infer_expr(e.values[i]).reveal())
-            dict_class_inst.bound((Union[tuple(key_type)], Union[tuple(value_type)]))
-            return dict_class_inst
-
-        elif isinstance(e, ast.Set):
-            set_class_inst = self.env.typeof('set')
-            set_type = [self.infer_expr(elmt).reveal() for elmt in e.elts]
-            if len(set_type) > 0:
-                set_class_inst.bound(Union[tuple(set_type)])
-            return set_class_inst
-
-        elif isinstance(e, ast.ListComp): # TODO: generator
-            list_class_inst = self.env.typeof('list')
-            return list_class_inst
-
-        elif isinstance(e, ast.SetComp): # TODO: generator
-            set_class_inst = self.env.typeof('set')
-            return set_class_inst
-
-        elif isinstance(e, ast.DictComp): # TODO: generator
-            dict_class_inst = self.env.typeof('dict')
-            return dict_class_inst
-
-        elif isinstance(e, ast.GeneratorExp): # TODO: generator
-            tuple_class_inst = self.env.typeof('tuple')
-            return tuple_class_inst
-
-        elif isinstance(e, ast.Await):
-            pass
-
-        elif isinstance(e, ast.Yield):
-            pass
-
-        elif isinstance(e, ast.YieldFrom):
-            pass
-
-        elif isinstance(e, ast.Compare):
-            self.infer_expr(e.left) # ignore return
-            for c in e.comparators:
-                self.infer_expr(c) # ignore return
-
-            bool_inst = self.env.typeof('bool')
-            return bool_inst
-
-        elif isinstance(e, ast.Call):
-            callee = self.infer_expr(e.func)
-
-            if callee.is_class():
+                    handler = handlers[type(node)]
+                except KeyError:
+                    handler = self.handler_for(type(node))
+                value = handler(self, node)
+                if type(value) is GeneratorType:
+                    value = self.run_nested(value)
+                send = steps.send
+            except BaseException as exc:
+                value, send = exc, steps.throw
+                continue
+            if type(value) is Diagnostic and not catch:
+                return value
+
+    def run_stack(self, steps):
+        handlers = self.handlers
+        stack = [steps]
+        catches = [False] # does the handler at the same depth catch a Diagnostic
+        send, value = steps.send, None
+        while True:
+            try:
+                node = send(value)
+            except StopIteration as stop:
+                stack.pop()
+                catches.pop()
+                value = stop.value
+            except BaseException as exc:
+                stack.pop()
+                catches.pop()
+                if not stack:
+                    raise
+                send, value = stack[-1].throw, exc
+                continue
+            else:
+                catches[-1] = type(node) is Catch
+                if catches[-1]:
+                    node = node.node
                 try:
-                    funcType = callee.typeof("__init__") # try to unify init
-                    self.lazy_func_load(funcType)
-                except:
-                    return callee # create instance
+                    try:
+                        handler = handlers[type(node)]
+                    except KeyError:
+                        handler = self.handler_for(type(node))
+                    value = handler(self, node)
+                except BaseException as exc:
+                    send, value = stack[-1].throw, exc
+                    continue
+                if type(value) is GeneratorType:
+                    stack.append(value)
+                    catches.append(False)
+                    send, value = value.send, None
+                    continue
+            # value is the result of the child of stack[-1]
+            if type(value) is Diagnostic:
+                while stack and not catches[-1]:
+                    stack.pop()
+                    catches.pop()
+            if not stack:
+                return value
+            send = stack[-1].send
+
+    # dispatch table: ast class -> handler(inferer, node)
+    @classmethod
+    def handler_for(cls, node_class):
+        for base in node_class.__mro__:  # subclasses of handled nodes
+            if base in cls.handlers:
+                return cls.handlers[base]
+        return cls._unsupported
+
+    @classmethod
+    def register(cls, node_class, handler):
+        """Infer node_class with handler(inferer, node), a function or a generator of child nodes."""
+        cls.handlers[node_class] = handler
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._build_handlers()
+
+    @classmethod
+    def _build_handlers(cls):
+        # infer_<Node> methods handle the ast class of the same name. A
+        # subclass starts from its parent's table, register()ed handlers
+        # included, and adds the methods it defines itself
+        handlers = dict(getattr(cls, "handlers", {}))
+        if "IGNORED_NODES" in vars(cls):
+            handlers.update(dict.fromkeys(cls.IGNORED_NODES, cls._ignore))
+        for name in vars(cls):
+            node_name = name[len("infer_"):]
+            if not name.startswith("infer_") or not node_name[:1].isupper():
+                continue
+            node_class = getattr(ast, node_name, None)
+            if isinstance(node_class, type) and issubclass(node_class, ast.AST):
+                handlers[node_class] = getattr(cls, name)
+        cls.handlers = handlers
+
+    def _ignore(self, e):
+        pass
+
+    def _unsupported(self, e):
+        return Diagnostic(e, "Unsupported syntax")
+
+    # statements
+    # ----------
+    def infer_FunctionDef(self, e):
+        func_type = TypeWrapper(None, lazy_func_info={
+            'tree': e,
+            'env': self.env,
+            'cur_class': self.cur_class,
+        })
+        self.env.add(e.name, func_type)
+        self.functions.append(func_type)
+        self.owner[func_type] = self.cur_function
+
+    def infer_ClassDef(self, e):
+        newSymTable = SymTable(e.name, self.env)
+        self.env = newSymTable
+
+        cur_class_bak = self.cur_class
+        classType = TypeWrapper(self.env.env, e.name)
+        self.cur_class = classType
+
+        yield from self.statements(e.body)
+
+        # restore context
+        self.cur_class = cur_class_bak
+        self.env = self.env.parent
+        self.env.add(e.name, classType)
+
+    def infer_Return(self, e):
+        if e.value is None:
+            return Diagnostic(e, "Unsupported syntax")
+        valueType = yield Catch(e.value)
+        if type(valueType) is Diagnostic:
+            self.func_ret_type.append(TypeTerm.ANY) # a value all the same
+            return valueType
+        self.func_ret_type.append(valueType.reveal())
+
+    def infer_Assign(self, e):
+        valueType = yield e.value
+        for t in e.targets:
+            if isinstance(t, ast.Subscript):
+                continue
+            elif not isinstance(t, (ast.Name, ast.Attribute)):
+                return Diagnostic(t, "Unsupported assignment target")
             else:
-                funcType = callee
-
-            argList = []
-            for i in e.args:
-                argType = self.infer_expr(i).reveal()
-                argList.append(argType)
-            caller_ret = TypeWrapper.new_type_var().reveal()
-            caller = TypeWrapper(Callable[argList, caller_ret])
+                env, name = yield t
+                if name not in env:
+                    if isinstance(t, ast.Attribute): # attributes outlive the function
+                        TypeTerm.escape(valueType.reveal())
+                    env[name] = valueType.unshared()
+
+    def infer_For(self, e):
+        if not isinstance(e.target, (ast.Name, ast.Attribute)):
+            return Diagnostic(e.target, "Unsupported loop target")
+        env, target = yield e.target
+        if target in env:
+            return Diagnostic(e.target, "{} already has type {}", target, env[target])
+
+        item_type = TypeTerm.ANY # unless iter has a typed __iter__
+        iterType = yield Catch(e.iter)
+        iter = iterType.lookup("__iter__") if type(iterType) is not Diagnostic else None
+        iter = iter.reveal() if isinstance(iter, TypeWrapper) else None
+        if TypeWrapper.is_Callable(iter) and isinstance(iter, TypeTerm.App):
+            iter_type = TypeWrapper.get_callable_ret(iter) # typing.Iterator[T]
+            if isinstance(iter_type, TypeTerm.App):
+                item_type = TypeWrapper.get_arg(iter_type)[0]
+        env[target] = TypeWrapper(item_type)
 
-            self.unify_function(caller, funcType)
+        yield from self.statements(e.body)
+
+        for n in e.orelse:
+            yield n
 
-            if callee.is_class():
+    def infer_While(self, e):
+        yield e.test
+
+        yield from self.statements(e.body)
+
+        for i in e.orelse:
+            yield i
+
+    def infer_If(self, e):
+        yield e.test
+
+        yield from self.statements(e.body)
+
+        for i in e.orelse: # an elif chain is a chain of nested Ifs
+            yield i
+
+    def infer_With(self, e):
+        for i in e.items:
+            contextType = yield i.context_expr
+            if i.optional_vars:
+                env, name = yield i.optional_vars
+                env[name] = contextType.unshared()
+
+        yield from self.statements(e.body)
+
+    def infer_Try(self, e):
+        yield from self.statements(e.body)
+
+        for i in e.handlers:
+            yield from self.statements(i.body)
+
+        for i in e.finalbody:
+            yield i
+
+    def infer_Import(self, e):
+        for n in e.names:
+            module_name = n.name
+            self.env.add_module(module_name, n.asname)
+
+    def infer_ImportFrom(self, e):
+        for n in e.names:
+            module_name = f"{e.module}"
+            self.env.add_module(module_name, n.asname, target=n.name)
+
+    def infer_Global(self, e):
+        env = self.env
+        while env.parent is not None:
+            env = env.parent
+
+        for i in e.names:
+            if i in self.env.env:
+                return Diagnostic(e, "{} is assigned to before global declaration", i)
+            nameType = env.lookup(i)
+            if nameType is None:
+                return Diagnostic(e, "{} not found in symbol table: {}", i, env)
+            self.env.add(i, nameType)
+
+    def infer_Nonlocal(self, e):
+        if self.env.parent is None:
+            return Diagnostic(e, "nonlocal declaration not allowed at module level")
+        env = self.env.parent
+        if env.parent is None:
+            return Diagnostic(e, "no binding for nonlocal {} found", e.names[0])
+
+        for i in e.names:
+            if i not in env.env:
+                return Diagnostic(e, "no binding for nonlocal {} found", i)
+            self.env.add(i, env.typeof(i))
+
+    def infer_Expr(self, e):
+        return (yield e.value)
+
+    # expressions
+    # -----------
+    def infer_BoolOp(self, e):
+        for v in e.values:
+            yield v # ignore return
+
+        bool_inst = self.env.typeof('bool')
+        return bool_inst
+
+    def infer_BinOp(self, e):
+        # promotion below retargets the operands in place
+        leftType = (yield e.left).unshared()
+        rightType = (yield e.right).unshared()
+
+        # backup for error restore used
+        leftOriType = leftType.type
+        leftOriClass = leftType.class_name
+        rightOriType = rightType.type
+        rightOriClass = rightType.class_name
+
+        # promote type if can coerce
+        if leftType.can_coerce(rightType):
+            leftType.type = rightType.type
+            leftType.class_name = rightType.class_name
+        elif rightType.can_coerce(leftType):
+            rightType.type = leftType.type
+            rightType.class_name = leftType.class_name
+
+        def do(a, op_func, b):
+            funcType = a.lookup(op_func) if op_func is not None else None
+            if not isinstance(funcType, TypeWrapper):
+                return False
+            argList = [b.reveal()]
+            resultType = TypeWrapper.new_type_var().reveal()
+            callType = TypeWrapper(TypeTerm.callable_of(argList, resultType))
+            return self.unify_function(callType, funcType)
+
+        # left op, then right op
+        if do(leftType, self._get_magic(e.op, reverse=False), rightType):
+            return leftType
+        if do(rightType, self._get_magic(e.op, reverse=True), leftType):
+            return rightType
+        leftType.type = leftOriType
+        leftType.class_name = leftOriClass
+        rightType.type = rightOriType
+        rightType.class_name = rightOriClass
+        return Diagnostic(e, "BinOp failed: {} {} {}", leftType, type(e.op).__name__, rightType)
+
+    def infer_UnaryOp(self, e):
+        # TODO: Invert | Not | UAdd | USub, check magic function
+        return (yield e.operand)
+
+    def infer_Lambda(self, e):
+        env_bak = self.env
+        self.env = SymTable(None, None)
+
+        # create type variables for each argument
+        argList = list()
+        for i in e.args.args:
+            argName = i.arg
+            argTypeVar = TypeWrapper.new_type_var()
+            self.env.add(argName, argTypeVar)
+            argList.append(argTypeVar.reveal())
+
+        # generate body type
+        bodyType = (yield e.body).reveal()
+        inferredType = TypeWrapper(TypeTerm.callable_of(argList, bodyType))
+
+        # context switch back
+        self.env = env_bak
+
+        return inferredType
+
+    def infer_Dict(self, e):
+        dict_class_inst = self.env.typeof('dict')
+        key_type = yield from self.infer_elements(e.keys)
+        value_type = yield from self.infer_elements(e.values)
+        dict_class_inst.bound((Subtype.join(key_type), Subtype.join(value_type)))
+        return dict_class_inst
+
+    def infer_Set(self, e):
+        set_class_inst = self.env.typeof('set')
+        set_type = yield from self.infer_elements(e.elts)
+        if len(set_type) > 0:
+            set_class_inst.bound(Subtype.join(set_type))
+        return set_class_inst
+
+    def infer_ListComp(self, e): # TODO: generator
+        list_class_inst = self.env.typeof('list')
+        return list_class_inst
+
+    def infer_SetComp(self, e): # TODO: generator
+        set_class_inst = self.env.typeof('set')
+        return set_class_inst
+
+    def infer_DictComp(self, e): # TODO: generator
+        dict_class_inst = self.env.typeof('dict')
+        return dict_class_inst
+
+    def infer_GeneratorExp(self, e): # TODO: generator
+        tuple_class_inst = self.env.typeof('tuple')
+        return tuple_class_inst
+
+    def infer_Compare(self, e):
+        yield e.left # ignore return
+        for c in e.comparators:
+            yield c # ignore return
+
+        bool_inst = self.env.typeof('bool')
+        return bool_inst
+
+    def infer_Call(self, e):
+        callee = yield e.func
+
+        if callee.is_class():
+            # try to unify a user __init__ that is not inferred yet
+            funcType = callee.lookup("__init__")
+            if funcType is None or funcType.lazy_func_info is None:
                 return callee # create instance
-            else:
-                return TypeWrapper(caller_ret)
+            try:
+                funcType = self.lazy_func_load(funcType).instance()
+            except InferenceError:
+                return callee
+        else:
+            funcType = callee
 
-        elif isinstance(e, ast.FormattedValue):
-            pass
+        argList = []
+        for i in e.args:
+            argType = (yield i).reveal()
+            argList.append(argType)
+        caller_ret = TypeWrapper.new_type_var().reveal()
+        caller = TypeWrapper(TypeTerm.callable_of(argList, caller_ret))
 
-        elif isinstance(e, ast.JoinedStr):
-            pass
+        if not self.unify_function(caller, funcType):
+            return Diagnostic(e, "Function args: {} and {} are not matched", caller, funcType)
+        self.record_call(funcType)
 
-        elif isinstance(e, ast.Constant):
-            if e.value is None:
-                return TypeWrapper(type(None))
-            typeName = type(e.value).__name__
-            constant_inst = self.env.typeof(typeName)
-            return constant_inst
-
-        elif isinstance(e, ast.Attribute):
-            ctx = type(e.ctx).__name__
-            if ctx == "Store":
-                valueType = self.infer_expr(e.value)
-                if not valueType.is_class():
-                    raise Exception("Can not store variable to non class instance")
-                return valueType.type, e.attr
-            elif ctx == "Load":
-                valueType = self.infer_expr(e.value)
-                attrType = valueType.typeof(e.attr)
-                if attrType.lazy_func_info is not None:
-                    return self.lazy_func_load(attrType)
-                return attrType
-            else:
-                raise Exception("Not implemented attribute operation")
-
-        elif isinstance(e, ast.Subscript):
-            ctx = type(e.ctx).__name__
-            if ctx == "Store": # TODO: need unify
-                pass
-            elif ctx == "Load": # TODO: check index type
-                valueType = self.infer_expr(e.value)
-                valueRealType = TypeWrapper.reveal_type_var(valueType.reveal())
-
-                if TypeWrapper.has_arg(valueRealType):
-                    itemType = TypeWrapper.get_arg(valueRealType)
-                    if TypeWrapper.is_List(valueRealType) or TypeWrapper.is_Tuple(valueRealType) or TypeWrapper.is_Set(valueRealType):
-                        typeName = itemType[0].__name__
-                        constant_inst = self.env.typeof(typeName)
-                        return constant_inst
-                    elif TypeWrapper.is_Dict(valueRealType):
-                        typeName = itemType[1].__name__
-                        constant_inst = self.env.typeof(typeName)
-                        return constant_inst
-                    else:
-                        raise Exception("Not implemented load")
-                else:
-                    raise Exception("Not implemented load")
-            else:
-                raise Exception("Not implemented attribute operation")
+        if callee.is_class():
+            return callee # create instance
+        else:
+            return TypeWrapper(caller_ret)
+
+    def infer_Constant(self, e):
+        if e.value is None:
+            return TypeWrapper.of(TypeTerm.NONE)
+        typeName = type(e.value).__name__
+        constant_inst = self.env.typeof(typeName)
+        return constant_inst
+
+    def infer_Attribute(self, e):
+        ctx = type(e.ctx).__name__
+        if ctx == "Store":
+            valueType = yield e.value
+            if not valueType.is_class():
+                return Diagnostic(e, "Can not store variable to non class instance")
+            return valueType.type, e.attr
+        elif ctx == "Load":
+            valueType = yield e.value
+            attrType = valueType.lookup(e.attr)
+            if attrType is None:
+                return Diagnostic(e, "{} has no attribute {}", valueType, e.attr)
+            if isinstance(valueType, TypeWrapper):
+                valueType.refresh_attr(e.attr, attrType)
+            if attrType.lazy_func_info is not None:
+                self.lazy_func_load(attrType)
+            return attrType.instance()
+        else:
+            return Diagnostic(e, "Not implemented attribute operation")
 
-        elif isinstance(e, ast.Starred):
+    def infer_Subscript(self, e):
+        ctx = type(e.ctx).__name__
+        if ctx == "Store": # TODO: need unify
             pass
-
-        elif isinstance(e, ast.Name):
-            ctx = type(e.ctx).__name__
-            if ctx == "Store":
-                return self.env.env, e.id
-            elif ctx == "Load":
-                if e.id in BASIC_TYPES:
-                    return TypeWrapper(BASIC_TYPES[e.id])
-                nameType = self.env.typeof(e.id)
-                if isinstance(nameType, SymTable):
-                    return TypeWrapper(nameType.env, e.id)
-                elif nameType.lazy_func_info is not None:
-                    return self.lazy_func_load(nameType)
-                return nameType
+        elif ctx == "Load": # TODO: check index type
+            valueType = yield e.value
+            valueRealType = TypeWrapper.reveal_type_var(valueType.reveal())
+
+            if TypeWrapper.has_arg(valueRealType):
+                itemType = TypeWrapper.get_arg(valueRealType)
+                if TypeWrapper.is_List(valueRealType) or TypeWrapper.is_Tuple(valueRealType) or TypeWrapper.is_Set(valueRealType):
+                    typeName = getattr(TypeTerm.to_typing(itemType[0]), "__name__", None)
+                elif TypeWrapper.is_Dict(valueRealType):
+                    typeName = getattr(TypeTerm.to_typing(itemType[1]), "__name__", None)
+                else:
+                    return Diagnostic(e, "Not implemented load")
+                constant_inst = self.env.lookup(typeName) if typeName is not None else None
+                if constant_inst is None:
+                    return Diagnostic(e, "Not implemented load of {}", valueRealType)
+                return constant_inst
             else:
-                raise Exception("Not implemented name operation")
-
-        elif isinstance(e, ast.List):
-            list_class_inst = self.env.typeof('list')
-            list_type = [self.infer_expr(elmt).reveal() for elmt in e.elts]
-            if len(list_type) > 0:
-                list_class_inst.bound(Union[tuple(list_type)])
-            return list_class_inst
-
-        elif isinstance(e, ast.Tuple):
-            tuple_class_inst = self.env.typeof('tuple')
-            tuple_type = [self.infer_expr(elmt).reveal() for elmt in e.elts]
-            if len(tuple_type) > 0:
-                tuple_class_inst.bound(tuple(tuple_type))
-            return tuple_class_inst
-
+                return Diagnostic(e, "Not implemented load")
+        else:
+            return Diagnostic(e, "Not implemented attribute operation")
+
+    def infer_Name(self, e):
+        ctx = type(e.ctx).__name__
+        if ctx == "Store":
+            return self.env.env, e.id
+        elif ctx == "Load":
+            if e.id in BASIC_TYPES:
+                return TypeWrapper.of(TypeTerm.con(BASIC_TYPES[e.id]))
+            nameType = self.env.lookup(e.id)
+            if nameType is None:
+                return Diagnostic(e, "{} not found in symbol table: {}", e.id, self.env)
+            if isinstance(nameType, SymTable):
+                return TypeWrapper(nameType.env, e.id, fresh_attrs=set())
+            elif nameType.lazy_func_info is not None:
+                self.lazy_func_load(nameType)
+            return nameType.instance()
         else:
-            raise Exception(f"{e.lineno}: Unsupported syntax")
+            return Diagnostic(e, "Not implemented name operation")
+
+    def infer_List(self, e):
+        list_class_inst = self.env.typeof('list')
+        list_type = yield from self.infer_elements(e.elts)
+        if len(list_type) > 0:
+            list_class_inst.bound(Subtype.join(list_type))
+        return list_class_inst
+
+    def infer_Tuple(self, e):
+        tuple_class_inst = self.env.typeof('tuple')
+        tuple_type = []
+        for elmt in e.elts:
+            tuple_type.append((yield elmt).reveal())
+        if len(tuple_type) > 0:
+            tuple_class_inst.bound(tuple(tuple_type))
+        return tuple_class_inst
 
     def lazy_func_load(self, func_type):
+        """Infer the function of func_type, after the functions it calls."""
+        info = func_type.lazy_func_info
+        if info is None:
+            raise Exception(f"{func_type.reveal()} is already inferred")
+        if 'params' in info: # in progress: a recursive use, with the type infer_group() assumes
+            info['used'] = True
+            return func_type
+        for group in self.schedule(func_type):
+            group = [f for f in group if f.lazy_func_info is not None] # not inferred meanwhile
+            if group:
+                self.infer_group(group)
+        return func_type
+
+    def schedule(self, func_type):
+        """Groups of func_type and the uninferred functions it reaches, callees first."""
+        # strongly connected components in reverse topological order, Tarjan's algorithm
+        order = []
+        index = {func_type: 0}
+        low = {func_type: 0}
+        stack = [func_type]
+        on_stack = {func_type}
+        work = [(func_type, iter(self.callees(func_type)))]
+        while work:
+            node, succs = work[-1]
+            for succ in succs:
+                if succ not in index:
+                    index[succ] = low[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(self.callees(succ))))
+                    break
+                elif succ in on_stack:
+                    low[node] = min(low[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    group = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        group.append(member)
+                        if member is node:
+                            break
+                    order.append(group)
+        return order
+
+    def callees(self, func_type):
+        """Uninferred functions the body of func_type calls by name or through self."""
+        info = func_type.lazy_func_info
+        if info is None:
+            return []
+        if 'calls' not in info: # name -> called through self
+            names = info['calls'] = {}
+            args = info['tree'].args.args
+            self_name = args[0].arg if info['cur_class'] is not None and args else None
+            for node in ast.walk(info['tree']):
+                if not isinstance(node, ast.Call):
+                    continue
+                if isinstance(node.func, ast.Name):
+                    names[node.func.id] = False
+                elif isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name) \
+                        and node.func.value.id == self_name:
+                    names[node.func.attr] = True
+        result = []
+        for name, method in info['calls'].items():
+            callee = info['cur_class'].type.get(name) if method else info['env'].lookup(name)
+            if isinstance(callee, TypeWrapper) and callee.lazy_func_info is not None \
+                    and 'params' not in callee.lazy_func_info:
+                result.append(callee)
+        return result
+
+    def infer_group(self, group):
+        """Infer mutually recursive functions, to a fixed point of their return types."""
+        # inside the group uses are monomorphic: the bodies share the
+        # parameter types and assume the return types of the last pass
+        functions_mark = len(self.functions)
+        diagnostics_mark = len(self.diagnostics)
+        TypeTerm.enter_level()
+        try:
+            for f in group:
+                e = f.lazy_func_info['tree']
+                args = e.args.args[1:] if f.lazy_func_info['cur_class'] is not None else e.args.args
+                f.lazy_func_info['params'] = [TypeTerm.Var() for _ in args]
+            TypeTerm.enter_level() # the variables of an assumption are local to a pass
+            rets = [TypeTerm.Var() for _ in group]
+            TypeTerm.leave_level()
+            for _ in range(FIXPOINT_ITERATIONS):
+                for f, ret in zip(group, rets):
+                    f.type = TypeTerm.callable_of(f.lazy_func_info['params'], ret)
+                    f.lazy_func_info['used'] = False
+                passes = [self.infer_function(f) for f in group]
+                # the least fixed point: a result of the group not known yet
+                # adds nothing to the return types
+                unknown = {TypeTerm.find(r) for r in rets if isinstance(r, TypeTerm.Var)}
+                passes = [(args, self.join_returns(returns, unknown), calls)
+                          for args, returns, calls in passes]
+                assumed = [TypeTerm.generalize(ret) for ret in rets]
+                inferred = [TypeTerm.generalize(ret) for _, ret, _ in passes]
+                changed = [a.code != i.code for a, i in zip(assumed, inferred)]
+                if not any(changed) or not any(f.lazy_func_info['used'] for f in group):
+                    break
+                # else another pass; still changing after the last one is Any
+                TypeTerm.enter_level()
+                rets = [t.instantiate(TypeTerm.fresh(t.slots)) for t in inferred]
+                TypeTerm.leave_level()
+                self.discard_pass(group, functions_mark, diagnostics_mark)
+            else:
+                passes = [(args, TypeTerm.ANY if c else ret, calls)
+                          for (args, ret, calls), c in zip(passes, changed)]
+            for f, (args, ret, _) in zip(group, passes):
+                f.type = TypeTerm.callable_of(args, ret)
+                f.lazy_func_info = None
+        finally:
+            TypeTerm.leave_level()
+            for f in group:
+                if f.lazy_func_info is not None: # failed, inferred again at its next use
+                    f.lazy_func_info.pop('params', None)
+                    f.type = None
+
+        # variables only the function reaches are renewed at every use, so
+        # the body is inferred once for call sites of any types
+        for f, (_, _, calls) in zip(group, passes):
+            f.scheme, settled = Scheme.generalize(f.type, calls)
+            for call in settled:
+                self.record(call)
+
+    def discard_pass(self, group, functions_mark, diagnostics_mark):
+        # drop what the bodies of group added since the marks, with the
+        # functions they defined; functions inferred meanwhile that were
+        # defined elsewhere are done for good and keep theirs
+        stale = set(group)
+        for f in self.functions[functions_mark:]: # owners are defined first
+            if self.owner.get(f) in stale:
+                stale.add(f)
+        self.functions[functions_mark:] = [f for f in self.functions[functions_mark:] if f not in stale]
+        self.diagnostics[diagnostics_mark:] = [d for d in self.diagnostics[diagnostics_mark:]
+                                               if self.owner.get(d) not in stale]
+
+    def infer_function(self, func_type):
+        """One pass over the body of func_type: its argument types, returned types and calls."""
+        TypeTerm.enter_level()
         try:
             e = func_type.lazy_func_info['tree']
             env = func_type.lazy_func_info['env']
             cur_class = func_type.lazy_func_info['cur_class']
+            params = func_type.lazy_func_info['params']
 
             # context save
             env_bak = self.env
-            self.env = SymTable(e.name, env)
+            self.env = SymTable(e.name, env, func_type)
             cur_class_bak = self.cur_class
             self.cur_class = cur_class
+            cur_function_bak = self.cur_function
+            self.cur_function = func_type
             func_ret_type_bak = self.func_ret_type
             self.func_ret_type = []
+            func_calls_bak = self.func_calls
+            self.func_calls = func_calls = []
 
             # check is infering class
             if self.cur_class is not None:
@@ -456,16 +770,21 @@ class Inferer:
                 args = e.args.args[1:]
             else:
                 args = e.args.args
+            self.cur_class = None # functions nested in a method are no methods
 
-            # infer args type
+            # infer args type, recursive calls see them as params
             argList = []
             default_start = len(args) - len(e.args.defaults)
             for i, arg in enumerate(args):
                 argName = arg.arg
                 if i >= default_start:
                     argType = self.infer_expr(e.args.defaults[i - default_start])
+                    if type(argType) is Diagnostic:
+                        raise argType.exception()
+                    argType = argType.unshared()
+                    TypeTerm.bind(params[i], argType.reveal())
                 else:
-                    argType = TypeWrapper.new_type_var()
+                    argType = TypeWrapper(params[i])
                 self.env.add(argName, argType)
                 argList.append(argType.reveal())
 
@@ -473,79 +792,185 @@ class Inferer:
             self.infer_body(e)
 
             # generate body type
-            if self.cur_class is not None and e.name == "__init__":
-                bodyType = type(None)
-            else:
-                bodyType = Union[tuple(self.func_ret_type)] if len(self.func_ret_type) else type(None)
-            func_type.type = Callable[argList, bodyType]
-            func_type.lazy_func_info = None
-
-            return func_type
+            if cur_class is not None and e.name == "__init__":
+                retList = [TypeTerm.NONE]
+            elif self.func_ret_type:
+                retList = self.func_ret_type
+            else: # a return in a statement given up on still returns a value
+                retList = [TypeTerm.ANY if self.returns_value(e) else TypeTerm.NONE]
         finally:
+            TypeTerm.leave_level()
             # restore context
             self.func_ret_type = func_ret_type_bak
+            self.func_calls = func_calls_bak
             self.env = env_bak
             self.cur_class = cur_class_bak
-
+            self.cur_function = cur_function_bak
+        return argList, retList, func_calls
 
     # helpers
     # -------
+    @staticmethod
+    def returns_value(e):
+        """Does a return statement of function e, outside nested scopes, return a value?"""
+        nodes = list(e.body)
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, ast.Return) and node.value is not None:
+                return True
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+                nodes.extend(ast.iter_child_nodes(node))
+        return False
+
+    @staticmethod
+    def join_returns(returns, unknown):
+        """Join of returns, leaving out the unbound variables of unknown."""
+        known = [t for t in returns
+                 if not (isinstance(t, TypeTerm.Var) and TypeTerm.find(t) in unknown
+                         and TypeTerm.resolve(t) is None)]
+        return Subtype.join(known or returns)
+
+    def record_call(self, func_type):
+        """Note a call of an instance of a generalized function, see record()."""
+        if func_type.call is not None:
+            self.record(func_type.call)
+
+    def record(self, call):
+        # inside a body the call waits for the function's scheme, else the
+        # callee's template is instantiated for it, and for its own calls
+        if self.func_calls is not None:
+            self.func_calls.append(call)
+            return
+        work = [call]
+        while work:
+            scheme, values = work.pop()
+            t = TypeTerm.resolved(scheme.template.instantiate(values))
+            if t in scheme.instances: # made already, with the same calls
+                continue
+            scheme.instances[t] = None
+            work.extend(zip(scheme.callees, (c.args for c in t.args[1:])))
+
+    def infer_elements(self, elts):
+        """Distinct types of the elements of a literal; one inference per literal_shape()."""
+        types = {}
+        shapes = {}
+        for elt in elts:
+            shape = self.literal_shape(elt)
+            if shape is None:
+                types[(yield elt).reveal()] = None
+                continue
+            try:
+                t = shapes[shape]
+            except KeyError:
+                t = shapes[shape] = (yield elt).reveal()
+            types[t] = None
+        return list(types)
+
+    @classmethod
+    def literal_shape(cls, e):
+        """Key shared by literals of constants of the same type, None otherwise."""
+        # nested literals are walked with an explicit stack, tables may nest deeply
+        kind = type(e)
+        if kind is ast.Constant:
+            return type(e.value)
+        if kind in (ast.Tuple, ast.List, ast.Set) and e.elts:  # a flat row, the usual case
+            types = [type(c.value) if type(c) is ast.Constant else None for c in e.elts]
+            if None not in types:
+                return (kind, tuple(types) if kind is ast.Tuple else tuple(dict.fromkeys(types)))
+        # parents come before their children in order, so reversed it gives
+        # every child's shape before its parent's
+        order = []
+        stack = [e]
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+            if kind not in cls.LITERAL_NODES:
+                return None
+            children = node.keys + node.values if kind is ast.Dict else node.elts
+            if not children or None in children:  # empty (own type variable) or **unpacking
+                return None
+            order.append(node)
+            stack.extend([c for c in children if type(c) is not ast.Constant])
+        shapes = {}
+        for node in reversed(order):
+            kind = type(node)
+            children = node.keys + node.values if kind is ast.Dict else node.elts
+            types = [type(c.value) if type(c) is ast.Constant else shapes[c] for c in children]
+            if kind is ast.Tuple:
+                shapes[node] = (kind, tuple(types))
+            elif kind is ast.Dict:
+                n = len(node.keys)
+                shapes[node] = (kind, tuple(dict.fromkeys(types[:n])), tuple(dict.fromkeys(types[n:])))
+            else:
+                shapes[node] = (kind, tuple(dict.fromkeys(types)))
+        return shapes[e]
+
     def unify_function(self, caller: TypeWrapper, callee: TypeWrapper):
-        caller_args = TypeWrapper.get_callable_args(caller.reveal())
-        callee_args = TypeWrapper.get_callable_args(callee.reveal())
-        caller_body = TypeWrapper.get_callable_ret(caller.reveal())
-        callee_body = TypeWrapper.get_callable_ret(callee.reveal())
+        """Unify a call of type caller with function type callee; False if they do not match."""
+        caller_type = caller.reveal()
+        callee_type = callee.reveal()
+        if not (TypeWrapper.is_Callable(callee_type) and isinstance(callee_type, TypeTerm.App)):
+            return False # not a function type
+        caller_args = TypeWrapper.get_callable_args(caller_type)
+        callee_args = TypeWrapper.get_callable_args(callee_type)
+        caller_body = TypeWrapper.get_callable_ret(caller_type)
+        callee_body = TypeWrapper.get_callable_ret(callee_type)
 
         for caller_t, callee_t in zip(caller_args, callee_args):
-            if caller_t is Ellipsis or callee_t is Ellipsis:
+            if caller_t is TypeTerm.ELLIPSIS or callee_t is TypeTerm.ELLIPSIS:
                 break
-            self.unify_arg(TypeWrapper(caller_t), TypeWrapper(callee_t))
-        self.unify_ret(TypeWrapper(caller_body), TypeWrapper(callee_body))
+            if caller_t.ground and callee_t.ground and Subtype.compatible(caller_t, callee_t):
+                continue # nothing to bind, a repeated pair is a cache hit
+            if not self.unify_arg(TypeWrapper.of(caller_t), TypeWrapper.of(callee_t)):
+                return False
+        return self.unify_ret(TypeWrapper.of(caller_body), TypeWrapper.of(callee_body))
 
     def unify_arg(self, caller, callee):
-        if caller.is_type_var() and callee.is_type_var():
-            callee.bound(caller.reveal())
-        elif issubclass(caller.reveal_origin(), callee.reveal_origin()):
-            if TypeWrapper.has_arg(caller.reveal()) and TypeWrapper.has_arg(callee.reveal()):
-                caller_args = TypeWrapper.get_arg(caller.reveal())
-                callee_args = TypeWrapper.get_arg(callee.reveal())
-                for caller_t, callee_t in zip(caller_args, callee_args):
-                    if caller_t is Ellipsis or callee_t is Ellipsis:
-                        break
-                    self.unify_arg(TypeWrapper(caller_t), TypeWrapper(callee_t))
-        else:
-            self.unify(caller, callee)
+        return self.unify_nested(caller, callee, bind_caller=False)
 
     def unify_ret(self, caller, callee):
-        if caller.is_type_var() and callee.is_type_var():
-            caller.bound(callee.reveal())
-        elif issubclass(caller.reveal_origin(), callee.reveal_origin()):
-            if TypeWrapper.has_arg(caller.reveal()) and TypeWrapper.has_arg(callee.reveal()):
-                caller_args = TypeWrapper.get_arg(caller.reveal())
-                callee_args = TypeWrapper.get_arg(callee.reveal())
-                for caller_t, callee_t in zip(caller_args, callee_args):
-                    if caller_t is Ellipsis or callee_t is Ellipsis:
-                        break
-                    self.unify_ret(TypeWrapper(caller_t), TypeWrapper(callee_t))
-        else:
-            self.unify(caller, callee)
+        return self.unify_nested(caller, callee, bind_caller=True)
+
+    def unify_nested(self, caller, callee, bind_caller):
+        # caller against callee, then their type arguments pairwise, in
+        # the order of a recursive walk
+        work = [(caller, callee)]
+        while work:
+            caller, callee = work.pop()
+            if caller.is_type_var() and callee.is_type_var():
+                if bind_caller:
+                    bound = TypeTerm.bind(caller.type, callee.reveal())
+                else:
+                    bound = TypeTerm.bind(callee.type, caller.reveal())
+                if not bound:
+                    return False
+                continue
+            sub = Subtype.is_subclass(caller.reveal_origin(), callee.reveal_origin())
+            if sub is None:
+                return False # issubclass() refuses e.g. typing.Union
+            if sub:
+                if TypeWrapper.has_arg(caller.reveal()) and TypeWrapper.has_arg(callee.reveal()):
+                    caller_args = TypeWrapper.get_arg(caller.reveal())
+                    callee_args = TypeWrapper.get_arg(callee.reveal())
+                    pairs = []
+                    for caller_t, callee_t in zip(caller_args, callee_args):
+                        if caller_t is TypeTerm.ELLIPSIS or callee_t is TypeTerm.ELLIPSIS:
+                            break
+                        pairs.append((TypeWrapper.of(caller_t), TypeWrapper.of(callee_t)))
+                    work.extend(reversed(pairs))
+            elif not self.unify(caller, callee):
+                return False
+        return True
 
     def unify(self, caller, callee):
         if caller.is_type_var():
-            caller.bound(callee.reveal())
+            return TypeTerm.bind(caller.type, callee.reveal())
         elif callee.is_type_var():
-            callee.bound(caller.reveal())
-        elif TypeWrapper.reveal_type_var(caller.reveal()) == TypeWrapper.reveal_type_var(callee.reveal()):
-            return
-        elif callee.is_union():
-            unionType = TypeWrapper.reveal_type_var(TypeWrapper.get_arg(callee.reveal()))
-            callerType = TypeWrapper.reveal_type_var(caller.reveal())
-            if callerType in unionType:
-                return
-            else:
-                raise Exception(f"Function args: {caller.reveal()} and {callee.reveal()} are not matched")
-        else:
-            raise Exception(f"Function args: {caller.reveal()} and {callee.reveal()} are not matched")
+            return TypeTerm.bind(callee.type, caller.reveal())
+        callerType = TypeWrapper.reveal_type_var(caller.reveal())
+        if callerType == TypeWrapper.reveal_type_var(callee.reveal()):
+            return True
+        return callee.is_union() and callerType in TypeWrapper.get_arg(callee.reveal())
 
     @staticmethod
     def _get_magic(op, reverse=None):
@@ -559,7 +984,7 @@ class Inferer:
                 "Or": "__ror__",
                 "And": "__rand__",
             }
-            return magics[type(op).__name__]
+            return magics.get(type(op).__name__)
         else:
             magics = {
                 "Add": "__add__",
@@ -570,5 +995,7 @@ class Inferer:
                 "Or": "__or__",
                 "And": "__and__",
             }
-            return magics[type(op).__name__]
+            return magics.get(type(op).__name__)
+
 
+Inferer._build_handlers()
@@ -0,0 +1,152 @@
+"""Memoized structural compatibility of type terms.
+
+Grown from check() in exp.py. Terms are hash-consed, so a pair of ground
+terms is a cheap dictionary key: asking again about the same argument and
+parameter types, e.g. every print(str), is a dictionary hit.
+"""
+import typing
+
+from . import TypeTerm
+from .Constant import BASIC_TYPES_LIST
+from .TypeTerm import App, Con
+
+
+# inferred unions with more members are widened to a common supertype
+UNION_WIDTH = 16
+
+_NO_ORIGIN = object()
+
+# ground pairs only, a type variable may be bound later
+_compatible = {}
+_subclasses = {}
+
+
+def is_subclass(provided, expected):
+    """issubclass() of two type origins, memoized.
+
+    None for origins issubclass() refuses, e.g. typing.Union: unification
+    fails on them.
+    """
+    key = (provided, expected)
+    try:
+        return _subclasses[key]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable origin
+        return _issubclass(provided, expected)
+    result = _subclasses[key] = _issubclass(provided, expected)
+    return result
+
+
+def _issubclass(provided, expected):
+    try:
+        return issubclass(provided, expected)
+    except TypeError:
+        return None
+
+
+def origin(t):
+    """The class issubclass() is asked about for term t, see
+    TypeWrapper.reveal_origin."""
+    if isinstance(t, App):
+        return t.origin
+    if isinstance(t, Con):
+        t = t.obj
+    o = getattr(t, "__origin__", _NO_ORIGIN)
+    if o is not _NO_ORIGIN:
+        return o
+    if t in BASIC_TYPES_LIST:
+        return t
+    return type(t)
+
+
+def compatible(provided, expected):
+    """Does unification accept ground term provided for ground term expected?
+
+    The answer of Inferer.unify_nested(), which binds nothing for terms
+    without variables, memoized.
+    """
+    key = (provided, expected)
+    try:
+        return _compatible[key]
+    except KeyError:
+        pass
+    result = _compatible[key] = _check(provided, expected)
+    return result
+
+
+def _check(provided, expected):
+    sub = is_subclass(origin(provided), origin(expected))
+    if sub is None:
+        return False
+    if not sub:
+        # Inferer.unify(): the same type, or a member of a Union
+        return provided is expected or (
+            isinstance(expected, App) and expected.alias is typing.Union and provided in expected.args
+        )
+    if not (isinstance(provided, App) and provided.args and isinstance(expected, App) and expected.args):
+        return True
+    for p, e in zip(provided.args, expected.args):
+        if p is TypeTerm.ELLIPSIS or e is TypeTerm.ELLIPSIS:
+            break
+        if not compatible(p, e):
+            return False
+    return True
+
+
+def _origin(t):
+    if isinstance(t, App):
+        return t.origin
+    if isinstance(t, Con):
+        return t.obj
+    return t
+
+
+def join(members):
+    """Normalized union of inferred types.
+
+    Flattened and deduplicated like TypeTerm.union(). Ground members that
+    another member accepts are absorbed, and a union of more than
+    UNION_WIDTH members is widened to a common supertype. Bound variables
+    are replaced by their types first, so that e.g. the fresh element
+    variables of many list literals of ints all become List[int].
+    """
+    t = TypeTerm.union(TypeTerm.resolved(m) for m in members)
+    if not (isinstance(t, App) and t.alias is typing.Union):
+        return t
+    if len(t.args) > UNION_WIDTH:
+        return widen(t.args)
+    kept = []
+    for m in t.args:
+        if m.ground:
+            if any(_below(m, k) for k in kept):
+                continue
+            kept = [k for k in kept if not _below(k, m)]
+        kept.append(m)
+    return t if len(kept) == len(t.args) else TypeTerm.union(kept)
+
+
+def _below(a, b):
+    # strictly: of two members accepting each other, e.g. classes whose
+    # origin unification can't tell apart, both are kept
+    return a.ground and b.ground and compatible(a, b) and not compatible(b, a)
+
+
+def widen(members):
+    """A common supertype of members."""
+    first = members[0]
+    if isinstance(first, App) and all(
+        isinstance(m, App) and m.alias is first.alias and len(m.args) == len(first.args)
+        for m in members
+    ):
+        # same generic, e.g. List[int] and List[str] widen to List[Union[int, str]]
+        return TypeTerm.rebuild(first, [join(args) for args in zip(*(m.args for m in members))])
+    if TypeTerm.ANY in members:
+        return TypeTerm.ANY
+    origins = [_origin(m) for m in members]
+    if not all(isinstance(o, type) for o in origins):  # variables, Ellipsis, ...
+        return TypeTerm.ANY
+    for base in origins[0].__mro__:
+        if all(is_subclass(o, base) for o in origins):
+            return TypeTerm.con(base)
+    return TypeTerm.ANY
@@ -1,5 +1,6 @@
 import ast
 import builtins
+import collections.abc
 import typing
 
 from . import Typer
@@ -8,10 +9,16 @@ from .TypeWrapper import TypeWrapper
 seeker = Typer.Seeker()
 
 class SymTable:
-    def __init__(self, name, parent=None):
+    __slots__ = ("parent", "name", "env", "childs", "function")
+
+    def __init__(self, name, parent=None, function=None):
+        # the table of a function body is the child of its FunctionDef
+        # node, a name may be defined more than once
         self.parent = parent
+        self.function = function
         if self.parent:
-            self.parent.childs[name] = self
+            key = name if function is None else function.lazy_func_info['tree']
+            self.parent.childs[key] = self
         self.name = name
         self.env = {}
         self.childs = {}
@@ -20,13 +27,14 @@ class SymTable:
         self.env[name] = t
 
     def add_module(self, module_name, as_name=None, target=None):
-        module_symtable = seeker.get_module_symtable(module_name)
         if target is not None: # load target only
+            module_symtable = seeker.get_module_symtable(module_name, targets=[target])
             if as_name is None:
                 self.env[target] = module_symtable.typeof(target)
             else:
                 self.env[as_name] = module_symtable.typeof(target)
         elif as_name is None: # load entire module
+            module_symtable = seeker.get_module_symtable(module_name)
             module_name_splitted = module_name.split('.')
             cur = self
             for i in module_name_splitted[:-1]:
@@ -35,42 +43,47 @@ class SymTable:
                 cur = cur.env[i]
             cur.env[module_name_splitted[-1]] = module_symtable
         else:
-            self.env[as_name] = module_symtable
+            self.env[as_name] = seeker.get_module_symtable(module_name)
 
     def typeof(self, name):
-        try:
-            nameType = self.get(name)
-            # refresh type variable for module which is already loaded in env
-            if isinstance(nameType, TypeWrapper) and nameType.need_refresh:
-                nameType.refresh()
-            elif isinstance(nameType, SymTable):
-                for k, v in nameType.env.items():
-                    if isinstance(v, TypeWrapper) and v.need_refresh:
-                        v.refresh()
-            return nameType
-        except:
-            try:
-                builtins_obj = seeker.get_builtins_obj(name)
-                if isinstance(builtins_obj, SymTable):
-                    return TypeWrapper(builtins_obj.env, class_name=name)
-                else:
-                    return builtins_obj
-            except:
-                raise Exception(f"{name} not found in symbol table: {self._get_symtable_name()}")
+        nameType = self.lookup(name)
+        if nameType is None:
+            raise Exception(f"{name} not found in symbol table: {self}")
+        return nameType
+
+    def lookup(self, name):
+        """Type of name in this table, a parent or builtins; None if it is
+        not defined."""
+        table = self
+        while table is not None:
+            if name in table.env:
+                nameType = table.env[name]
+                # refresh type variable for module which is already loaded in env,
+                # entries of a module table are refreshed once dereferenced
+                if isinstance(nameType, TypeWrapper) and nameType.need_refresh:
+                    nameType.refresh()
+                return nameType
+            table = table.parent
+        builtins_obj = seeker.get_builtins_obj(name)
+        if isinstance(builtins_obj, SymTable):
+            return TypeWrapper(builtins_obj.env, class_name=name)
+        return builtins_obj
 
     def get(self, name):
-        if name in self.env:
-            return self.env[name]
-        elif self.parent is not None:
-            return self.parent.get(name)
-        else:
-            raise Exception(f"{name} not found in symbol table: {self._get_symtable_name()}")
+        table = self
+        while table is not None:
+            if name in table.env:
+                return table.env[name]
+            table = table.parent
+        raise Exception(f"{name} not found in symbol table: {self}")
 
-    def _get_symtable_name(self):
-        if self.parent == None:
-            return self.name
-        else:
-            return f"{self.parent._get_symtable_name()}.{self.name}"
+    def __str__(self):
+        names = []
+        table = self
+        while table is not None:
+            names.append(str(table.name))
+            table = table.parent
+        return ".".join(reversed(names))
 
     def print(self, level=0):
         indent = '    ' * level
@@ -94,3 +107,65 @@ class SymTable:
 
         print(f"{indent}-----{level}-----")
 
+
+class LazyEnv(collections.abc.MutableMapping):
+    """Env of a LazySymTable, wrapping raw stub entries on first access."""
+
+    __slots__ = ("symtable", "raw", "entries", "removed")
+
+    def __init__(self, symtable, raw):
+        self.symtable = symtable
+        self.raw = raw
+        self.entries = {}
+        self.removed = set()
+
+    def __getitem__(self, name):
+        try:
+            return self.entries[name]
+        except KeyError:
+            pass
+        if name in self.removed:
+            raise KeyError(name)
+        v = self.raw[name]
+        # submodule or class
+        if isinstance(v, collections.abc.Mapping):
+            entry = LazySymTable(name, v, parent=self.symtable)
+        else:
+            entry = TypeWrapper(v, need_refresh=True)
+        self.entries[name] = entry
+        return entry
+
+    def __setitem__(self, name, t):
+        self.removed.discard(name)
+        self.entries[name] = t
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.entries.pop(name, None)
+        self.removed.add(name)
+
+    def __contains__(self, name):
+        return name in self.entries or (name not in self.removed and name in self.raw)
+
+    def __iter__(self):
+        names = dict.fromkeys(n for n in self.raw if n not in self.removed)
+        names.update(dict.fromkeys(self.entries))
+        return iter(names)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class LazySymTable(SymTable):
+    """Symbol table of a stub module or class.
+
+    Child tables and TypeWrappers are only created for the names that are
+    actually looked up.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, name, raw, parent=None):
+        super().__init__(name, parent)
+        self.env = LazyEnv(self, raw)
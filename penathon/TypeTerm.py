@@ -0,0 +1,485 @@
+"""Compact, hash-consed type terms used throughout inference.
+
+Structurally equal terms are the same object, so comparing or hashing a
+term is a pointer operation. typing objects are only built back at the
+output boundary, see to_typing().
+"""
+import itertools
+import threading
+import typing
+import weakref
+
+from .Constant import TYPE_DICT
+
+
+_var_ids = itertools.count()
+
+# bumped by every binding, results computed at an older generation may
+# depend on variables that have been bound since
+generation = 0
+
+
+class _Levels(threading.local):
+    # let-depth of the inference running on this thread: new variables are
+    # created at it, see enter_level() and generalize()
+    level = 0
+
+
+_levels = _Levels()
+
+
+def enter_level():
+    _levels.level += 1
+
+
+def leave_level():
+    _levels.level -= 1
+
+
+class Term:
+    __slots__ = ("wrapper", "__weakref__")  # wrapper: see TypeWrapper.of
+
+    def __repr__(self):
+        return repr(to_typing(self))
+
+
+class Con(Term):
+    """A type without arguments: a class, typing.Any, a bare alias, ..."""
+
+    __slots__ = ("obj", "name")
+    ground = True
+
+    def __init__(self, obj):
+        self.wrapper = None
+        self.obj = obj
+        try:
+            self.name = obj._name  # typing's alias name, e.g. bare Callable
+        except Exception:
+            self.name = None
+
+
+class Var(Term):
+    """Type variable.
+
+    Variables form a union-find forest; the root of a class holds the type
+    the whole class is bound to, see find() and bind(). The root's level is
+    the outermost let the class is reachable from, its constraints those of
+    a constrained TypeVar such as AnyStr.
+    """
+
+    __slots__ = ("id", "name", "parent", "rank", "level", "type", "constraints", "_typing")
+    ground = False
+
+    def __init__(self, name=None, bound=None, constraints=()):
+        self.wrapper = None
+        self.id = next(_var_ids)
+        self.name = name if name is not None else f"_{self.id}"
+        self.parent = None
+        self.rank = 0
+        self.level = _levels.level
+        self.type = bound
+        self.constraints = constraints
+        self._typing = None
+
+
+class App(Term):
+    """A generic alias applied to argument terms, e.g. List[int]."""
+
+    __slots__ = ("alias", "name", "origin", "args", "ground", "revealed", "_typing")
+
+    def __init__(self, alias, args):
+        self.wrapper = None
+        self.alias = alias
+        self.name, self.origin = _alias_info(alias)
+        self.args = args
+        self.ground = all(a.ground for a in args)  # no type variables inside
+        self.revealed = (-1, None)  # (generation, TypeWrapper.reveal_type_var)
+        self._typing = None
+
+
+# Con terms only wrap type objects and are few, keep them for good. App
+# terms may hold type variables, so drop them once nothing uses them.
+_cons = {}
+_apps = weakref.WeakValueDictionary()
+_aliases = {}
+_lock = threading.Lock()
+
+
+def _alias_info(alias):
+    try:
+        return _aliases[alias]
+    except KeyError:
+        pass
+    if alias is typing.Union:
+        info = (None, typing.Union)
+    else:
+        name = getattr(alias, "_name", None) if hasattr(alias, "__origin__") else None
+        info = (name, getattr(alias, "__origin__", alias))
+    _aliases[alias] = info
+    return info
+
+
+def con(obj):
+    try:
+        key = (type(obj), obj)
+        term = _cons.get(key)
+    except TypeError:  # unhashable, can't be shared
+        return Con(obj)
+    if term is None:
+        with _lock:
+            term = _cons.setdefault(key, Con(obj))
+    return term
+
+
+def app(alias, args):
+    key = (alias, args)
+    term = _apps.get(key)
+    if term is None:
+        with _lock:
+            term = _apps.get(key)
+            if term is None:
+                term = _apps[key] = App(alias, args)
+    return term
+
+
+def find(v):
+    """Root of the class of Var v, compressing the path to it."""
+    root = v
+    while root.parent is not None:
+        root = root.parent
+    while v.parent is not None and v.parent is not root:
+        v.parent, v = root, v.parent
+    return root
+
+
+def resolve(v):
+    """Type Var v is bound to, or None."""
+    return find(v).type
+
+
+def fresh(slots):
+    """New variables for the slots of a template, under the same constraints."""
+    return [Var(constraints=find(s).constraints) for s in slots]
+
+
+def bind(v, t):
+    """Bind Var v to t, a type or another Var. False if v is already bound,
+    if t contains v: the type would be infinite, or if v's constraints
+    don't admit t."""
+    global generation
+    r = find(v)
+    if not isinstance(t, Var):
+        if r.type is None:
+            if r.constraints:
+                t = admit(r.constraints, t)
+                if t is None:
+                    return False
+            if occurs(r, t):
+                return False
+            r.type = t
+            _lower(t, r.level)
+            generation += 1
+            return True
+        return r.type is t
+    s = find(t)
+    if r is s:
+        return True
+    if r.type is not None:  # only an unbound class may take on another one
+        return False
+    if s.type is not None and occurs(r, s.type):
+        return False
+    constraints = r.constraints or s.constraints
+    if r.constraints and s.constraints:
+        constraints = tuple(c for c in r.constraints if c in s.constraints)
+        if not constraints:
+            return False
+    if constraints and s.type is not None and admit(constraints, s.type) is not s.type:
+        return False
+    if r.rank < s.rank:
+        r, s = s, r
+    elif r.rank == s.rank:
+        r.rank += 1
+    s.parent = r
+    r.constraints = constraints
+    if r.type is None:
+        r.type = s.type
+    if s.level < r.level:
+        r.level = s.level
+    if r.type is not None:
+        _lower(r.type, r.level)
+    generation += 1
+    return True
+
+
+def admit(constraints, t):
+    """The constraint a variable bound to t takes on, as a TypeVar such as
+    AnyStr is bound to str for a subclass of str. None if none admits t."""
+    if t is ANY or t in constraints:
+        return t
+    if isinstance(t, Con) and isinstance(t.obj, type):
+        for c in constraints:
+            if isinstance(c, Con) and isinstance(c.obj, type) and issubclass(t.obj, c.obj):
+                return c
+    return None
+
+
+def occurs(r, t):
+    """Does the class of root r occur in t?"""
+    stack = [t]
+    while stack:
+        t = stack.pop()
+        if isinstance(t, Var):
+            s = find(t)
+            if s is r:
+                return True
+            if s.type is not None:
+                stack.append(s.type)
+        elif isinstance(t, App) and not t.ground:
+            stack.extend(t.args)
+    return False
+
+
+def _lower(t, level):
+    """Pull the variables of t down to level, t is now reachable from it."""
+    stack = [t]
+    while stack:
+        t = stack.pop()
+        if isinstance(t, Var):
+            r = find(t)
+            if r.level > level:
+                r.level = level
+                if r.type is not None:
+                    stack.append(r.type)
+        elif isinstance(t, App) and not t.ground:
+            stack.extend(t.args)
+
+
+def escape(t):
+    """t is stored where every let can reach it, e.g. a class attribute."""
+    _lower(t, 0)
+
+
+ANY = con(typing.Any)
+NONE = con(type(None))
+ELLIPSIS = con(Ellipsis)
+_RAW_NONE = con(None)  # bare `None` values of stubs
+
+
+def as_term(t):
+    # typing turns None into NoneType wherever it is used as an argument
+    if t is None or t is _RAW_NONE:
+        return NONE
+    if isinstance(t, Term):
+        return t
+    return from_typing(t, {})
+
+
+def union(members):
+    flat = []
+    for m in members:
+        m = as_term(m)
+        if isinstance(m, App) and m.alias is typing.Union:
+            flat.extend(m.args)
+        else:
+            flat.append(m)
+    flat = tuple(dict.fromkeys(flat))
+    if len(flat) == 0:
+        raise TypeError("Cannot take a Union of no types.")
+    if len(flat) == 1:
+        return flat[0]
+    # member order doesn't matter, the first order seen is kept for display
+    key = (typing.Union, frozenset(flat))
+    term = _apps.get(key)
+    if term is None:
+        with _lock:
+            term = _apps.get(key)
+            if term is None:
+                term = _apps[key] = App(typing.Union, flat)
+    return term
+
+
+def callable_of(args, ret):
+    if args is Ellipsis:
+        return app(typing.Callable, (ELLIPSIS, as_term(ret)))
+    return app(typing.Callable, tuple(as_term(a) for a in args) + (as_term(ret),))
+
+
+def list_of(t):
+    return app(typing.List, (as_term(t),))
+
+
+def set_of(t):
+    return app(typing.Set, (as_term(t),))
+
+
+def dict_of(k, v):
+    return app(typing.Dict, (as_term(k), as_term(v)))
+
+
+def tuple_of(ts):
+    return app(typing.Tuple, tuple(as_term(t) for t in ts))
+
+
+def rebuild(t, args):
+    """Same alias as App t, applied to args."""
+    if t.alias is typing.Union:
+        return union(args)
+    return app(t.alias, tuple(as_term(a) for a in args))
+
+
+class Template:
+    """Type skeleton compiled once, instantiated by filling variable slots.
+
+    code is a constant Term, the index of a slot, or (alias, child codes)
+    for a node that has slots below it.
+    """
+
+    __slots__ = ("code", "slots")
+
+    def __init__(self, code, slots):
+        self.code = code
+        self.slots = tuple(slots)
+
+    def instantiate(self, fresh):
+        """Term with the i-th slot replaced by fresh[i]."""
+        if not self.slots:
+            return self.code
+        return _build(self.code, fresh)
+
+
+def _build(code, fresh):
+    if isinstance(code, int):
+        return fresh[code]
+    if isinstance(code, Term):
+        return code
+    alias, children = code
+    args = tuple(_build(c, fresh) for c in children)
+    if alias is typing.Union:
+        return union(args)
+    return app(alias, args)
+
+
+def node(alias, children, t):
+    """Code for alias[children], or t itself when no child has a slot."""
+    if all(isinstance(c, Term) for c in children):
+        return t
+    return (alias, tuple(children))
+
+
+def slot(v, slots):
+    """Slot index of variable v, added to slots if new."""
+    for i, s in enumerate(slots):
+        if s is v:
+            return i
+    slots.append(v)
+    return len(slots) - 1
+
+
+_templates = {}
+
+
+def typing_template(t):
+    """Template of typing object t, with one slot per TypeVar."""
+    try:
+        key = (type(t), t)
+        return _templates[key]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable, compile it every time
+        key = None
+    slots = []
+    template = Template(_compile_typing(t, slots), slots)
+    if key is not None:
+        _templates[key] = template
+    return template
+
+
+def _compile_typing(t, slots):
+    if isinstance(t, typing.TypeVar):
+        return slot(t, slots)
+    args = getattr(t, "__args__", None)
+    origin = getattr(t, "__origin__", None)
+    if not args or origin is None:
+        return con(t)
+    children = tuple(_compile_typing(a, slots) for a in args)
+    if origin is typing.Union:
+        alias = typing.Union
+    else:
+        name = getattr(t, "_name", None)
+        alias = (TYPE_DICT.get(name) or getattr(typing, name, None) if name else None) or origin
+    if all(isinstance(c, Term) for c in children):
+        return _build((alias, children), ())
+    return (alias, children)
+
+
+def resolved(t):
+    """t with its bound variables replaced by their types."""
+    if isinstance(t, Var):
+        bound = resolve(t)
+        return t if bound is None else resolved(bound)
+    if isinstance(t, App) and not t.ground:
+        return rebuild(t, [resolved(a) for a in t.args])
+    return t
+
+
+def generalize(t):
+    """Type scheme of t, after leaving the let it was inferred in.
+
+    A template with a slot for every unbound variable created inside the
+    let and not reachable from outside it, to instantiate at every use.
+    """
+    slots = []
+    return Template(_generalize(t, _levels.level, slots), slots)
+
+
+def _generalize(t, level, slots):
+    if isinstance(t, Var):
+        r = find(t)
+        if r.type is not None:
+            return _generalize(r.type, level, slots)
+        return slot(r, slots) if r.level > level else r
+    if isinstance(t, App) and not t.ground:
+        return node(t.alias, [_generalize(a, level, slots) for a in t.args], t)
+    return t
+
+
+def from_typing(t, var_map):
+    """Term of typing object t, type variables are mapped through var_map."""
+    if isinstance(t, Term):
+        return t
+    template = typing_template(t)
+    fresh = []
+    for tv in template.slots:
+        try:
+            fresh.append(var_map[tv])
+        except KeyError:
+            bound = tv.__bound__
+            var_map[tv] = Var(
+                tv.__name__,
+                None if bound is None else from_typing(bound, var_map),
+                tuple(from_typing(c, var_map) for c in tv.__constraints__),
+            )
+            fresh.append(var_map[tv])
+    return template.instantiate(fresh)
+
+
+def to_typing(t):
+    """typing object of term t, for output only."""
+    if isinstance(t, Con):
+        return t.obj
+    if isinstance(t, App):
+        if t._typing is None:
+            args = tuple(to_typing(a) for a in t.args)
+            if t.alias is typing.Callable:
+                params = ... if t.args[0] is ELLIPSIS and len(args) == 2 else list(args[:-1])
+                t._typing = typing.Callable[params, args[-1]]
+            elif len(args) == 1:
+                t._typing = t.alias[args[0]]
+            else:
+                t._typing = t.alias[args]
+        return t._typing
+    if isinstance(t, Var):
+        if t._typing is None:
+            t._typing = typing.TypeVar(t.name)
+        return t._typing
+    return t
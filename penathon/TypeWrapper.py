@@ -1,28 +1,106 @@
 import typing
-import uuid
 
-from .Constant import BASIC_TYPES, BASIC_TYPES_LIST, TYPE_DICT
+from .Constant import BASIC_TYPES, TYPE_DICT
+from . import Subtype, TypeTerm
+from .TypeTerm import App, Con, Var
 
 CLASS_MAP = {}
 
+INT = TypeTerm.con(int)
+FLOAT = TypeTerm.con(float)
+COMPLEX = TypeTerm.con(complex)
+
+class Scheme:
+    """Generalized type of a user function, with the calls of its body that depend on it."""
+
+    __slots__ = ("template", "callees", "instances")
+
+    def __init__(self, template, callees):
+        self.template = template  # Tuple[function type, slot values of each call]
+        self.callees = callees  # Scheme of each call
+        # the template instantiated for every call made, deduplicated
+        self.instances = {}
+
+    @staticmethod
+    def generalize(t, calls):
+        """Scheme of function type t, and the calls of its body that do not depend on it."""
+        template = TypeTerm.generalize(TypeTerm.tuple_of([t] + [TypeTerm.tuple_of(v) for _, v in calls]))
+        code = template.code
+        if isinstance(code, TypeTerm.Term): # no slots at all
+            return Scheme(TypeTerm.Template(TypeTerm.tuple_of(code.args[:1]), ()), []), calls
+        # a call without slots does not depend on the function
+        alias, (t_code, *call_codes) = code
+        depends = [not isinstance(c, TypeTerm.Term) for c in call_codes]
+        kept = [c for c, d in zip(call_codes, depends) if d]
+        callees = [scheme for (scheme, _), d in zip(calls, depends) if d]
+        settled = [call for call, d in zip(calls, depends) if not d]
+        return Scheme(TypeTerm.Template((alias, (t_code, *kept)), template.slots), callees), settled
+
+
 class TypeWrapper:
-    def __init__(self, t, class_name=None, lazy_func_info=None, need_refresh=False):
+    __slots__ = (
+        "type", "class_name", "lazy_func_info", "need_refresh", "fresh_attrs",
+        "template", "refreshed", "shared", "is_gen", "scheme", "call",
+        "list_type", "tuple_type", "tuple_elmt", "set_type", "key_type", "value_type",
+    )
+
+    def __init__(self, t, class_name=None, lazy_func_info=None, need_refresh=False, fresh_attrs=None):
         self.type = t
         self.class_name = class_name
         self.lazy_func_info = lazy_func_info
         self.need_refresh = need_refresh
+        self.fresh_attrs = fresh_attrs  # attributes refreshed through this table, see refresh_attr
+        self.template = None
+        self.refreshed = None
+        self.shared = False
+        self.scheme = None  # Scheme of a user function
+        self.call = None  # (Scheme, slot values) of an instance of one
 
         if self.is_list(): self.list_init()
         elif self.is_tuple(): self.tuple_init()
         elif self.is_set(): self.set_init()
         elif self.is_dict(): self.dict_init()
 
+    @staticmethod
+    def of(t):
+        """Shared wrapper of term t, for uses that never store or retarget it."""
+        wrapper = t.wrapper
+        if wrapper is None:
+            wrapper = TypeWrapper(t)
+            wrapper.shared = True
+            t.wrapper = wrapper
+        return wrapper
+
+    def unshared(self):
+        """self, or a private copy if self is shared, before storing it."""
+        if not self.shared:
+            return self
+        return TypeWrapper(self.type, self.class_name)
+
+    def instance(self):
+        """Fresh instance of a generalized function, else self."""
+        if self.scheme is None or not self.scheme.template.slots:
+            return self
+        template = self.scheme.template
+        values = TypeTerm.fresh(template.slots)
+        inst = TypeWrapper(template.instantiate(values).args[0])
+        inst.call = (self.scheme, values)
+        return inst
+
+    def summary(self):
+        """Type to annotate with, the join of the call sites of a generalized function."""
+        if self.scheme is None or not self.scheme.instances:
+            return self.reveal()
+        calls = [TypeWrapper.reveal_type_var(t.args[0]) for t in self.scheme.instances]
+        args = [Subtype.join(a) for a in zip(*(TypeWrapper.get_callable_args(t) for t in calls))]
+        return TypeTerm.callable_of(args, Subtype.join(TypeWrapper.get_callable_ret(t) for t in calls))
+
     # init
     def list_init(self):
         self.list_type = self.get_callable_ret(self.type['pop'].reveal())
 
     def tuple_init(self):
-        self.tuple_type = self.get_callable_ret(self.type['__getitem__'].reveal()).__args__[0]
+        self.tuple_type = self.get_callable_ret(self.type['__getitem__'].reveal()).args[0]
 
     def set_init(self):
         self.set_type = self.get_callable_ret(self.type['pop'].reveal())
@@ -52,17 +130,17 @@ class TypeWrapper:
         return self.is_Callable(self.type)
 
     def is_type_var(self):
-        return isinstance(self.type, typing.TypeVar)
+        return isinstance(self.type, Var)
 
     def is_union(self):
         return self.is_Union(self.type)
 
     def can_coerce(self, t): # can self.type coerce to t
-        if self.reveal() is int and t.reveal() is float:
+        if self.reveal() is INT and t.reveal() is FLOAT:
             return True
-        elif self.reveal() is int and t.reveal() is complex:
+        elif self.reveal() is INT and t.reveal() is COMPLEX:
             return True
-        elif self.reveal() is float and t.reveal() is complex:
+        elif self.reveal() is FLOAT and t.reveal() is COMPLEX:
             return True
         else:
             return False
@@ -74,13 +152,28 @@ class TypeWrapper:
         else:
             raise Exception("Not a class instance or class definition")
 
+    def lookup(self, name):
+        """Attribute name of a class or instance, None if it has none."""
+        if self.class_name is not None and name in self.type:
+            return self.type[name]
+        return None
+
+    def refresh_attr(self, name, t):
+        # every load of a module (or imported class) name instantiates the
+        # entries dereferenced from it once, instead of the whole table
+        if self.fresh_attrs is None or name in self.fresh_attrs:
+            return
+        self.fresh_attrs.add(name)
+        if isinstance(t, TypeWrapper) and t.need_refresh:
+            t.refresh()
+
     def bound(self, t):
         if self.is_list():
             self.bound_type_var(self.list_type, t)
 
         elif self.is_tuple():
             self.tuple_elmt = t
-            self.bound_type_var(self.tuple_type, typing.Union[t])
+            self.bound_type_var(self.tuple_type, Subtype.join(t))
 
         elif self.is_set():
             self.bound_type_var(self.set_type, t)
@@ -95,232 +188,228 @@ class TypeWrapper:
     # reveal TypeWrapper to real type
     def reveal(self):
         if self.is_list():
-            return typing.List[self.list_type]
+            return TypeTerm.list_of(self.list_type)
 
         elif self.is_tuple():
-            return typing.Tuple[self.tuple_elmt]
+            return TypeTerm.tuple_of(self.tuple_elmt)
 
         elif self.is_set():
-            return typing.Set[self.set_type]
+            return TypeTerm.set_of(self.set_type)
 
         elif self.is_dict():
-            return typing.Dict[self.key_type, self.value_type]
+            return TypeTerm.dict_of(self.key_type, self.value_type)
 
         elif self.class_name:
             if self.class_name in BASIC_TYPES:
-                return BASIC_TYPES[self.class_name]
+                return TypeTerm.con(BASIC_TYPES[self.class_name])
             else:
                 try:
-                    return CLASS_MAP[self.class_name]
+                    return TypeTerm.con(CLASS_MAP[self.class_name])
                 except KeyError:
                     CLASS_MAP[self.class_name] = type(self.class_name, (object,), {})
-                    return CLASS_MAP[self.class_name]
+                    return TypeTerm.con(CLASS_MAP[self.class_name])
 
         return self.type
 
     def reveal_origin(self):
         r = self.reveal()
-        try:
-            return r.__origin__
-        except:
-            if r in BASIC_TYPES_LIST:
-                return r
-            return type(r)
+        if isinstance(r, Var):
+            return typing.TypeVar
+        return Subtype.origin(r)
 
     # refresh new type variable instance
     def refresh(self):
-        self.tv_map = {}
-        if not isinstance(self.type, dict):
-            self.type = self.refresh_recursive(self.type)
-
-    def refresh_recursive(self, t):
-        if isinstance(t, typing.TypeVar):
-            try:
-                return self.tv_map[str(t)]
-            except KeyError:
-                self.tv_map[str(t)] = typing.TypeVar(str(uuid.uuid4()))
-                return self.tv_map[str(t)]
+        if isinstance(self.type, dict):
+            return
+        # compiled once per stub type, a refresh then only allocates fresh
+        # variables for the slots of the template
+        if self.template is None or self.type is not self.refreshed:
+            slots = []
+            self.template = TypeTerm.Template(self.compile_refresh(self.type, slots), slots)
+        self.type = self.refreshed = self.template.instantiate(TypeTerm.fresh(self.template.slots))
+
+    @staticmethod
+    def compile_refresh(t, slots):
+        """Template code of t, with a slot for every variable a refresh renews."""
+        if isinstance(t, Var):
+            return TypeTerm.slot(t, slots)
 
         elif TypeWrapper.is_Callable(t):
             arg_list = TypeWrapper.get_callable_args(t)
             body_type = TypeWrapper.get_callable_ret(t)
-            if len(arg_list) == 1 and arg_list[0] is Ellipsis:
-                arg_list = ...
-            else:
-                for idx, a in enumerate(arg_list):
-                    arg_list[idx] = self.refresh_recursive(a)
-                body_type = self.refresh_recursive(body_type)
-            return typing.Callable[arg_list, body_type]
+            if len(arg_list) == 1 and arg_list[0] is TypeTerm.ELLIPSIS:
+                return t
+            children = [TypeWrapper.compile_refresh(a, slots) for a in arg_list]
+            children.append(TypeWrapper.compile_refresh(body_type, slots))
+            return TypeTerm.node(typing.Callable, children, t)
 
         elif TypeWrapper.is_List(t):
-            list_type = TypeWrapper.get_list_type(t)
-            return typing.List[self.refresh_recursive(list_type)]
+            list_type = TypeWrapper.compile_refresh(TypeWrapper.get_list_type(t), slots)
+            return TypeTerm.node(typing.List, [list_type], t)
 
         elif TypeWrapper.is_Tuple(t):
-            tupleType = [self.refresh_recursive(t) for t in TypeWrapper.get_tuple_type(t)]
-            return typing.Tuple[tuple(tupleType)]
+            tupleType = [TypeWrapper.compile_refresh(t, slots) for t in TypeWrapper.get_tuple_type(t)]
+            return TypeTerm.node(typing.Tuple, tupleType, t)
 
         elif TypeWrapper.is_Dict(t):
-            keyType = self.refresh_recursive(TypeWrapper.get_dict_type_key(t))
-            valueType = self.refresh_recursive(TypeWrapper.get_dict_type_value(t))
-            return typing.Dict[keyType, valueType]
+            keyType = TypeWrapper.compile_refresh(TypeWrapper.get_dict_type_key(t), slots)
+            valueType = TypeWrapper.compile_refresh(TypeWrapper.get_dict_type_value(t), slots)
+            return TypeTerm.node(typing.Dict, [keyType, valueType], t)
 
         elif TypeWrapper.is_Set(t):
-            setType = self.refresh_recursive(TypeWrapper.get_set_type(t))
-            return typing.Set[setType]
+            setType = TypeWrapper.compile_refresh(TypeWrapper.get_set_type(t), slots)
+            return TypeTerm.node(typing.Set, [setType], t)
 
         elif TypeWrapper.is_Union(t):
-            unionType = [self.refresh_recursive(t) for t in TypeWrapper.get_union_type(t)]
-            return typing.Union[tuple(unionType)]
-
-        elif hasattr(t, '__args__') and len(t.__args__) == 1:
-            try:
-                type_name = t._name
-                arg = self.refresh_recursive(t.__args__[0])
-                return TYPE_DICT[type_name][arg]
-            except:
-                return t
+            unionType = [TypeWrapper.compile_refresh(t, slots) for t in TypeWrapper.get_union_type(t)]
+            return TypeTerm.node(typing.Union, unionType, t)
+
+        elif isinstance(t, App) and len(t.args) == 1 and t.name in TYPE_DICT:
+            return TypeTerm.node(t.alias, [TypeWrapper.compile_refresh(t.args[0], slots)], t)
 
         else:
             return t
 
     # helper function
     @staticmethod
-    def is_Callable(t):  # caveat: can't use isinstance
-        return hasattr(t, '_name') and t._name == 'Callable'
+    def is_Callable(t):
+        return isinstance(t, (App, Con)) and t.name == 'Callable'
 
     @staticmethod
-    def is_List(t):  # caveat: can't use isinstance
-        return hasattr(t, '_name') and t._name == 'List'
+    def is_List(t):
+        return isinstance(t, (App, Con)) and t.name == 'List'
 
     @staticmethod
-    def is_Tuple(t):  # caveat: can't use isinstance
-        return hasattr(t, '_name') and t._name == 'Tuple'
+    def is_Tuple(t):
+        return isinstance(t, (App, Con)) and t.name == 'Tuple'
 
     @staticmethod
-    def is_Dict(t):  # caveat: can't use isinstance
-        return hasattr(t, '_name') and t._name == 'Dict'
+    def is_Dict(t):
+        return isinstance(t, (App, Con)) and t.name == 'Dict'
 
     @staticmethod
-    def is_Set(t):  # caveat: can't use isinstance
-        return hasattr(t, '_name') and t._name == 'Set'
+    def is_Set(t):
+        return isinstance(t, (App, Con)) and t.name == 'Set'
 
     @staticmethod
-    def is_Union(t):  # caveat: can't use isinstance
-        try:
-            return t.__origin__._name == 'Union'
-        except AttributeError:
-            return False
+    def is_Union(t):
+        return isinstance(t, App) and t.alias is typing.Union
 
     @staticmethod
     def has_arg(t):
-        return hasattr(t, '__args__') and len(t.__args__) != 0
+        return isinstance(t, App) and len(t.args) != 0
 
     @staticmethod
     def get_arg(t):
-        return list(t.__args__)
+        return list(t.args)
 
     @staticmethod
     def new_type_var():
-        return TypeWrapper(typing.TypeVar(str(uuid.uuid4())))
+        return TypeWrapper(Var())
 
     @staticmethod
     def get_list_type(t):
-        return t.__args__[0]
+        return t.args[0]
 
     @staticmethod
     def get_tuple_type(t):
-        return list(t.__args__)
+        return list(t.args)
 
     @staticmethod
     def get_dict_type_key(t):
-        return t.__args__[0]
+        return t.args[0]
 
     @staticmethod
     def get_dict_type_value(t):
-        return t.__args__[1]
+        return t.args[1]
 
     @staticmethod
     def get_set_type(t):
-        return t.__args__[0]
+        return t.args[0]
 
     @staticmethod
     def get_union_type(t):
-        return list(t.__args__)
+        return list(t.args)
 
     @staticmethod
     def get_callable_ret(t):
-        return t.__args__[-1]
+        return t.args[-1]
 
     @staticmethod
     def get_callable_args(t):
-        return list(t.__args__[:-1])
+        return list(t.args[:-1])
 
     @staticmethod
     def get_typevar_bound(t):
-        return t.__bound__
+        return TypeTerm.resolve(t)
 
     @staticmethod
     def bound_type_var(tv, t):
-        if not isinstance(tv, typing.TypeVar):
+        if not isinstance(tv, Var):
             raise Exception(f"{tv} is not a type variable")
-        if isinstance(tv.__bound__, typing.TypeVar):
-            if t is tv.__bound__: # already bound
-                return
-            TypeWrapper.bound_type_var(tv.__bound__, t)
-        else:
-            if tv.__bound__ is not None and tv.__bound__ != t:
-                raise Exception(f"Bound {t} failed. Type Variable {tv} is already bound: {tv.__bound__}")
-            else:
-                tv.__bound__ = t
+        if not TypeTerm.bind(tv, t):
+            if TypeTerm.resolve(tv) is None:
+                raise Exception(f"Bound {t} failed. Type Variable {tv} occurs in it")
+            raise Exception(f"Bound {t} failed. Type Variable {tv} is already bound: {TypeTerm.resolve(tv)}")
 
     @staticmethod
     def reveal_type_var(t):
-        if isinstance(t, typing.TypeVar):
-            if t.__bound__ is None:
-                return typing.Any
+        if isinstance(t, App):
+            # terms without variables reveal to themselves, others are
+            # memoized until the next binding
+            if t.ground:
+                return t
+            gen, revealed = t.revealed
+            if gen != TypeTerm.generation:
+                gen = TypeTerm.generation
+                revealed = TypeWrapper._reveal_type_var(t)
+                t.revealed = (gen, revealed)
+            return revealed
+        return TypeWrapper._reveal_type_var(t)
+
+    @staticmethod
+    def _reveal_type_var(t):
+        if isinstance(t, Var):
+            bound = TypeTerm.resolve(t)
+            if bound is None:
+                return TypeTerm.ANY
             else:
-                return TypeWrapper.reveal_type_var(t.__bound__)
+                return TypeWrapper.reveal_type_var(bound)
 
         elif TypeWrapper.is_Callable(t):
             arg_list = TypeWrapper.get_callable_args(t)
             body_type = TypeWrapper.get_callable_ret(t)
-            if len(arg_list) == 1 and arg_list[0] is Ellipsis:
+            if len(arg_list) == 1 and arg_list[0] is TypeTerm.ELLIPSIS:
                 arg_list = ...
             else:
                 for idx, a in enumerate(arg_list):
                     arg_list[idx] = TypeWrapper.reveal_type_var(a)
                 body_type = TypeWrapper.reveal_type_var(body_type)
-            return typing.Callable[arg_list, body_type]
+            return TypeTerm.callable_of(arg_list, body_type)
 
         elif TypeWrapper.is_List(t):
             list_type = TypeWrapper.get_list_type(t)
-            return typing.List[TypeWrapper.reveal_type_var(list_type)]
+            return TypeTerm.list_of(TypeWrapper.reveal_type_var(list_type))
 
         elif TypeWrapper.is_Tuple(t):
             tupleType = [TypeWrapper.reveal_type_var(t) for t in TypeWrapper.get_tuple_type(t)]
-            return typing.Tuple[tuple(tupleType)]
+            return TypeTerm.tuple_of(tupleType)
 
         elif TypeWrapper.is_Dict(t):
             keyType = TypeWrapper.reveal_type_var(TypeWrapper.get_dict_type_key(t))
             valueType = TypeWrapper.reveal_type_var(TypeWrapper.get_dict_type_value(t))
-            return typing.Dict[keyType, valueType]
+            return TypeTerm.dict_of(keyType, valueType)
 
         elif TypeWrapper.is_Set(t):
             setType = TypeWrapper.reveal_type_var(TypeWrapper.get_set_type(t))
-            return typing.Set[setType]
+            return TypeTerm.set_of(setType)
 
         elif TypeWrapper.is_Union(t):
             unionType = [TypeWrapper.reveal_type_var(t) for t in TypeWrapper.get_union_type(t)]
-            return typing.Union[tuple(unionType)]
-
-        elif hasattr(t, '__args__') and len(t.__args__) == 1:
-            try:
-                type_name = t._name
-                arg = TypeWrapper.reveal_type_var(t.__args__[0])
-                return TYPE_DICT[type_name][arg]
-            except:
-                return t
+            return TypeTerm.union(unionType)
+
+        elif isinstance(t, App) and len(t.args) == 1 and t.name in TYPE_DICT:
+            return TypeTerm.rebuild(t, [TypeWrapper.reveal_type_var(t.args[0])])
 
         else:
             return t
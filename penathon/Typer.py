@@ -3,17 +3,24 @@ from typing import *
 import sys
 from collections import defaultdict
 import builtins
+import collections.abc
+import hashlib
+import io
 import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
-from . import SymTable
+from . import TypeTerm
 from .TypeWrapper import TypeWrapper
 from .Constant import TYPE_DICT
 
 
-symbol_table = {}
-
-
 class AnnoVisitor(ast.NodeVisitor):
+    def __init__(self, aliases=None):
+        # aliases (TypeVars and the like) of the stub being converted
+        self.aliases = {} if aliases is None else aliases
+
     def generic_visit(self, node):
         ast.NodeVisitor.generic_visit(self, node)
         # print(node, "Not Implement AnnoVisitor")
@@ -48,7 +55,7 @@ class AnnoVisitor(ast.NodeVisitor):
             return TYPE_DICT[node.id]
         except KeyError:
             try:
-                return symbol_table[node.id]
+                return self.aliases[node.id]
             except KeyError:
                 # print(f"Warning: No {node.id}", file=sys.stderr)
                 return Any
@@ -57,10 +64,86 @@ class AnnoVisitor(ast.NodeVisitor):
         return node.value
 
 
-class Visitor(ast.NodeVisitor):
+def _annotation_key(node, names):
+    # structural key of an annotation, collecting names that may be aliases
+    if isinstance(node, ast.Name):
+        if node.id not in TYPE_DICT:
+            names.append(node.id)
+        return node.id
+    elif isinstance(node, ast.Constant):
+        return (type(node.value), node.value)
+    elif isinstance(node, ast.Subscript):
+        return (
+            "[]",
+            _annotation_key(node.value, names),
+            _annotation_key(node.slice, names),
+        )
+    elif isinstance(node, (ast.Tuple, ast.List)):
+        return (type(node).__name__,) + tuple(
+            _annotation_key(n, names) for n in node.elts
+        )
+    elif isinstance(node, (ast.Index, ast.Expr)):
+        return _annotation_key(node.value, names)
+    else:
+        return ast.dump(node)
+
+
+class AnnotationCache:
+    """Process-wide memo of converted annotations.
+
+    Keyed by the annotation's structure plus the current value of every
+    alias it names, so e.g. Optional[str] is converted once for all stubs
+    while Iterable[_T] is converted once per distinct _T.
+    """
+
     def __init__(self):
+        self.types = {}
+        self.hits = 0
+        self.misses = 0
+
+    def convert(self, node, aliases):
+        if node is None:
+            return AnnoVisitor(aliases).visit(node)
+        names = []
+        key = _annotation_key(node, names)
+        try:
+            key = (key, tuple(aliases.get(n, n) for n in names))
+            typ = self.types[key]
+            self.hits += 1
+            return typ
+        except KeyError:
+            pass
+        except TypeError:  # unhashable alias value
+            return AnnoVisitor(aliases).visit(node)
+        typ = AnnoVisitor(aliases).visit(node)
+        if not isinstance(typ, list):  # Callable argument lists are mutable
+            self.types[key] = typ
+        self.misses += 1
+        return typ
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reuse": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        self.types.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+annotation_cache = AnnotationCache()
+
+
+class Visitor(ast.NodeVisitor):
+    def __init__(self, aliases=None):
         self.cur_class_name = None
         self.storage = defaultdict(dict)
+        # alias scope of this stub module
+        self.aliases = {} if aliases is None else aliases
 
     def generic_visit(self, node):
         ast.NodeVisitor.generic_visit(self, node)
@@ -81,7 +164,7 @@ class Visitor(ast.NodeVisitor):
 
     def visit_AnnAssign(self, node: ast.AnnAssign):
         name = self.visit(node.target)
-        typ = AnnoVisitor().visit(node.annotation)
+        typ = annotation_cache.convert(node.annotation, self.aliases)
         if self.cur_class_name is None:
             self.storage[name] = typ
         else:
@@ -103,21 +186,22 @@ class Visitor(ast.NodeVisitor):
             return result[: -len(node.defaults)]
 
     def visit_arg(self, node: ast.arg):
-        return AnnoVisitor().visit(node.annotation)
+        return annotation_cache.convert(node.annotation, self.aliases)
 
     def visit_FunctionDef(self, node: ast.FunctionDef):
         args = self.visit(node.args)
-        ret = AnnoVisitor().visit(node.returns)
+        ret = annotation_cache.convert(node.returns, self.aliases)
+        typ = Callable[args, ret]
         if self.cur_class_name is None:
-            self.storage[node.name] = Callable[args, ret]
+            self.storage[node.name] = typ
         else:
-            self.storage[self.cur_class_name][node.name] = Callable[args, ret]
-        return (node.name, Callable[args, ret])
+            self.storage[self.cur_class_name][node.name] = typ
+        return (node.name, typ)
 
     def visit_Assign(self, node: ast.Assign):
         name = self.visit(node.targets[0])
         value = self.visit(node.value)
-        symbol_table[name] = value
+        self.aliases[name] = value
 
     def visit_Constant(self, node: ast.Constant):
         return node.value
@@ -184,105 +268,696 @@ class Visitor(ast.NodeVisitor):
         return node.attr
 
 
-class Typer:
-    storage = {}
+PKG_DIR = os.path.dirname(os.path.abspath(__file__))
+TYPESHED_DIR = os.path.join(PKG_DIR, "typeshed")
+STDLIB_DIR = os.path.join(TYPESHED_DIR, "stdlib")
+INDEX_FILE = os.path.join(PKG_DIR, "typeshed.idx")
+INDEX_FORMAT = 3
+
+# stdlib modules most inputs touch, pre-parsed by StubCache.warm()
+WARM_MODULES = [
+    "builtins", "typing", "abc", "argparse", "bisect", "collections",
+    "contextlib", "copy", "csv", "datetime", "enum", "functools", "glob",
+    "hashlib", "heapq", "io", "itertools", "json", "logging", "math",
+    "operator", "os", "os.path", "pathlib", "pickle", "random", "re",
+    "shutil", "socket", "string", "struct", "subprocess", "sys", "tempfile",
+    "textwrap", "threading", "time", "traceback", "unittest", "uuid",
+]
+
+# ast.parse is not safe to run from several threads at once on some
+# CPython 3.11 releases ("AST constructor recursion depth mismatch")
+parse_lock = threading.Lock()
+
+
+def typeshed_revision():
+    """Commit of the typeshed checkout, or None if it can not be determined."""
+    git_dir = os.path.join(TYPESHED_DIR, ".git")
+    try:
+        if os.path.isfile(git_dir):  # submodule checkout: "gitdir: <path>"
+            with open(git_dir) as f:
+                git_dir = os.path.join(TYPESHED_DIR, f.read().split(":", 1)[1].strip())
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+        if head.startswith("ref: "):
+            with open(os.path.join(git_dir, head[len("ref: "):])) as f:
+                head = f.read().strip()
+        return head
+    except OSError:
+        return None
+
+
+def _make_type_var(name, constraints, bound, covariant, contravariant):
+    return TypeVar(
+        name, *constraints, bound=bound, covariant=covariant, contravariant=contravariant
+    )
+
+
+class _StubPickler(pickle.Pickler):
+    # stub TypeVars are not importable by name and ForwardRefs hold compiled
+    # code, so pickle both by value instead
+    def reducer_override(self, obj):
+        if isinstance(obj, ForwardRef):
+            return ForwardRef, (
+                obj.__forward_arg__,
+                obj.__forward_is_argument__,
+                obj.__forward_module__,
+            )
+        if isinstance(obj, TypeVar):
+            return _make_type_var, (
+                obj.__name__,
+                obj.__constraints__,
+                obj.__bound__,
+                obj.__covariant__,
+                obj.__contravariant__,
+            )
+        return NotImplemented
+
+
+class TypeshedIndex:
+    """Trie over typeshed/stdlib, resolving dotted names without syscalls.
+
+    Every node is a dict with "children", "module" (path of <name>.pyi) and
+    "package" (the directory listing when <name>/__init__.pyi exists). Paths
+    are stored relative to the stdlib directory so the trie can be pickled.
+    dirs maps every scanned directory to its mtime, see is_current().
+    """
+
+    DIRS = ["3.7", "3.6", "3", "2and3", "2"]
+
+    def __init__(self, roots, dirs, stdlib_dir=STDLIB_DIR):
+        self.roots = roots
+        self.dirs = dirs
+        self.stdlib_dir = stdlib_dir
 
     @staticmethod
-    def _recursive_find_file(cur_path, splitted_name):
-        if len(splitted_name) == 0:
-            return [], -1, False
-        new_path = os.path.join(cur_path, splitted_name[0])
-        file_names, remain_len, found = Typer._recursive_find_file(
-            new_path, splitted_name[1:]
+    def _new_node():
+        return {"children": {}, "module": None, "package": None}
+
+    @staticmethod
+    def _scan(path, rel_path, node, dirs):
+        dirs[rel_path] = os.stat(path).st_mtime_ns
+        names = []
+        for entry in os.scandir(path):
+            names.append(entry.name)
+            rel_entry = os.path.join(rel_path, entry.name)
+            if entry.is_dir():
+                child = node["children"].setdefault(entry.name, TypeshedIndex._new_node())
+                listing = TypeshedIndex._scan(entry.path, rel_entry, child, dirs)
+                if "__init__.pyi" in listing:
+                    child["package"] = [os.path.join(rel_entry, n) for n in listing]
+            elif entry.name.endswith(".pyi"):
+                child = node["children"].setdefault(entry.name[:-4], TypeshedIndex._new_node())
+                child["module"] = rel_entry
+        return names
+
+    @classmethod
+    def scan(cls, stdlib_dir=STDLIB_DIR):
+        roots = []
+        dirs = {}
+        for d in cls.DIRS:
+            root = cls._new_node()
+            if os.path.isdir(os.path.join(stdlib_dir, d)):
+                cls._scan(os.path.join(stdlib_dir, d), d, root, dirs)
+            else:
+                dirs[d] = None
+            roots.append(root)
+        return cls(roots, dirs, stdlib_dir)
+
+    def is_current(self):
+        # a stub added or removed changes the mtime of its directory
+        for rel_path, mtime in self.dirs.items():
+            try:
+                if os.stat(os.path.join(self.stdlib_dir, rel_path)).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                if mtime is not None:
+                    return False
+        return True
+
+    def find(self, splitted_name):
+        # first version directory wins, within it the deepest match wins and
+        # a package shadows a module of the same name
+        for root in self.roots:
+            found = None
+            node = root
+            for depth, name in enumerate(splitted_name):
+                node = node["children"].get(name)
+                if node is None:
+                    break
+                if node["package"] is not None:
+                    found = (node["package"], len(splitted_name) - depth - 1)
+                elif node["module"] is not None:
+                    found = ([node["module"]], len(splitted_name) - depth - 1)
+            if found is not None:
+                file_names, remain_len = found
+                return [os.path.join(self.stdlib_dir, f) for f in file_names], remain_len
+        raise Exception(f"{splitted_name} not found in typeshed")
+
+
+class _StubScanner:
+    """Finds the top-level storage keys each stub statement writes.
+
+    Mirrors Visitor's traversal (If tests, class nesting, alias assignments)
+    but leaves every annotation unconverted.
+    """
+
+    def __init__(self):
+        self.visitor = Visitor()
+        self.cur_class_name = None
+        self.aliases = {}
+        self.statements = []
+        self.defs = {}
+
+    def scan(self, body):
+        for node in body:
+            if isinstance(node, ast.If):
+                self.scan(node.body if self.visitor.visit(node.test) else node.orelse)
+                continue
+            aliases = self.aliases
+            keys = []
+            self._walk(node, keys)
+            if self.visitor.aliases != aliases:
+                self.aliases = dict(self.visitor.aliases)
+            if keys:
+                self.statements.append((node, aliases))
+                for key in dict.fromkeys(keys):
+                    self.defs.setdefault(key, []).append(len(self.statements) - 1)
+
+    def _walk(self, node, keys):
+        if isinstance(node, ast.ClassDef):
+            self.cur_class_name = node.name
+            for n in node.body:
+                self._walk(n, keys)
+            self.cur_class_name = None
+        elif isinstance(node, (ast.FunctionDef, ast.AnnAssign)):
+            if self.cur_class_name is not None:
+                keys.append(self.cur_class_name)
+            elif isinstance(node, ast.FunctionDef):
+                keys.append(node.name)
+            else:
+                keys.append(self.visitor.visit(node.target))
+        elif isinstance(node, ast.If):
+            for n in node.body if self.visitor.visit(node.test) else node.orelse:
+                self._walk(n, keys)
+        elif isinstance(node, ast.Assign):
+            self.visitor.visit(node)
+        elif not isinstance(node, ast.Expr):
+            # rare statements, let a real Visitor tell which keys they write
+            probe = Visitor(self.visitor.aliases)
+            probe.cur_class_name = self.cur_class_name
+            probe.visit(node)
+            self.cur_class_name = probe.cur_class_name
+            keys.extend(probe.storage)
+
+
+class LazyStub(collections.abc.Mapping):
+    """Parsed stub whose top-level definitions are converted on first access.
+
+    Built either from source, where statements are indexed by the keys they
+    write together with the aliases visible to them, or from the per-symbol
+    pickles of the on-disk index.
+    """
+
+    def __init__(self, statements=(), defs=None, pickled=None):
+        self.statements = list(statements)
+        self.defs = defs or {}
+        self.pickled = pickled or {}
+        self.values = {}
+        self.lock = threading.Lock()
+        # keys a statement writes that are not converted yet, the statement
+        # is dropped once they all are
+        self.pending = [0] * len(self.statements)
+        for indexes in self.defs.values():
+            for i in indexes:
+                self.pending[i] += 1
+
+    @classmethod
+    def from_source(cls, source):
+        scanner = _StubScanner()
+        with parse_lock:
+            tree = ast.parse(source)
+        scanner.scan(tree.body)
+        return cls(scanner.statements, scanner.defs)
+
+    def __getitem__(self, key):
+        try:
+            return self.values[key]
+        except KeyError:
+            pass
+        with self.lock:
+            if key in self.values:  # converted by another thread meanwhile
+                return self.values[key]
+            if key in self.pickled:
+                value = pickle.loads(self.pickled[key])
+            elif key in self.defs:
+                value = self._convert(key)
+            else:
+                raise KeyError(key)
+            self.values[key] = value
+        return value
+
+    def __contains__(self, key):
+        return key in self.defs or key in self.pickled
+
+    def __iter__(self):
+        return iter(self.defs or self.pickled)
+
+    def __len__(self):
+        return len(self.defs or self.pickled)
+
+    def _convert(self, key):
+        value = None
+        for i in self.defs[key]:
+            node, aliases = self.statements[i]
+            v = Visitor(dict(aliases))
+            v.visit(node)
+            part = v.storage[key]
+            if isinstance(part, dict) and isinstance(value, dict):
+                value.update(part)  # class body split over several statements
+            else:
+                value = dict(part) if isinstance(part, dict) else part
+        for i in self.defs[key]:
+            self.pending[i] -= 1
+            if not self.pending[i]:
+                self.statements[i] = None
+        return value
+
+
+class LazyModule(collections.abc.MutableMapping):
+    """Per-lookup view of a stub module or class.
+
+    Entries are instantiated with fresh type variables when first read, and
+    submodules of a package are only loaded once accessed.
+    """
+
+    def __init__(self, stub=None, submodules=None, tv_map=None):
+        self.stub = stub if stub is not None else {}
+        self.submodules = submodules or {}
+        self.tv_map = tv_map if tv_map is not None else {}
+        self.entries = {}
+
+    def fork(self):
+        """New view of the same stubs, with type variables of its own."""
+        module = LazyModule(self.stub, dict(self.submodules))
+        for key, value in self.entries.items():
+            # submodules recorded into this one, class views are rebuilt lazily
+            if isinstance(value, LazyModule) and value.tv_map is not self.tv_map:
+                module.entries[key] = value.fork()
+        return module
+
+    def __getitem__(self, key):
+        try:
+            return self.entries[key]
+        except KeyError:
+            pass
+        if key in self.submodules:
+            value = stub_cache.load(self.submodules[key])
+        elif isinstance(self.stub[key], dict):  # class, sharing the module's variables
+            value = LazyModule(self.stub[key], tv_map=self.tv_map)
+        else:
+            value = StubCache.instantiate(self.stub[key], self.tv_map)
+        self.entries[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+
+    def __delitem__(self, key):
+        del self.entries[key]
+
+    def __contains__(self, key):
+        return key in self.entries or key in self.submodules or key in self.stub
+
+    def __iter__(self):
+        keys = dict.fromkeys(self.stub)
+        keys.update(dict.fromkeys(self.submodules))
+        keys.update(dict.fromkeys(self.entries))
+        return iter(keys)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class StubCache:
+    """Process-wide cache of parsed typeshed stubs.
+
+    Each stub is parsed once per (path, target) and kept as a LazyStub
+    template. Every load hands out a LazyModule view with fresh type
+    variables, so binding the variables of one lookup never leaks into
+    another.
+
+    Templates missing from memory are taken from the on-disk index built by
+    build_index() when the stub's hash still matches, and parsed otherwise.
+    """
+
+    def __init__(self, index_file=INDEX_FILE):
+        self.templates = {}
+        self.index_file = index_file
+        self.index = None
+        self.paths = None
+        self.hits = 0
+        self.index_hits = 0
+        self.misses = 0
+        # guards the index and the per-stub locks, which serialize loading
+        # of one stub while other stubs load concurrently
+        self.lock = threading.RLock()
+        self.locks = {}
+
+    @staticmethod
+    def _target():
+        return (tuple(sys.version_info[:2]), sys.platform)
+
+    @staticmethod
+    def _key(file_name):
+        return (os.path.realpath(file_name),) + StubCache._target()
+
+    @staticmethod
+    def _index_name(file_name):
+        return os.path.relpath(
+            os.path.realpath(file_name), os.path.realpath(TYPESHED_DIR)
         )
-        if found:
-            return file_names, remain_len, found
-        file_name1 = os.path.join(cur_path, splitted_name[0], "__init__.pyi")
-        if os.path.isfile(file_name1):
-            file_names = []
-            for f in os.listdir(os.path.join(cur_path, splitted_name[0])):
-                file_names.append(os.path.join(cur_path, splitted_name[0], f))
-            return file_names, len(splitted_name) - 1, True
-        file_name2 = os.path.join(cur_path, splitted_name[0] + ".pyi")
-        if os.path.isfile(file_name2):
-            return [file_name2], len(splitted_name) - 1, True
-        return [], -1, False
+
+    def load(self, file_name):
+        return LazyModule(self.template(file_name))
+
+    def load_module(self, file_names):
+        if len(file_names) == 1:
+            return self.load(file_names[0])
+        # package: __init__.pyi holds the module, other stubs are submodules
+        init = None
+        submodules = {}
+        for fn in file_names:
+            name = os.path.basename(fn)
+            if name == "__init__.pyi":
+                init = self.template(fn)
+            elif name.endswith(".pyi"):
+                submodules[name[: -len(".pyi")]] = fn
+        return LazyModule(init, submodules)
+
+    def template(self, file_name):
+        """Shared parsed stub. Never bind or mutate it, instantiate it instead."""
+        key = self._key(file_name)
+        try:
+            template = self.templates[key]
+            self.hits += 1
+            return template
+        except KeyError:
+            pass
+        with self._lock_for(key):
+            if key in self.templates:  # loaded by another thread meanwhile
+                self.hits += 1
+                return self.templates[key]
+            template = self._load_indexed(file_name)
+            if template is None:
+                with open(file_name, "rb") as f:
+                    template = LazyStub.from_source(f.read())
+                self.misses += 1
+            else:
+                self.index_hits += 1
+            self.templates[key] = template
+        return template
+
+    def _lock_for(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def instantiate(t, tv_map):
+        """Type terms of template t, with a fresh Var per stub TypeVar."""
+        if isinstance(t, dict):
+            return {k: StubCache.instantiate(v, tv_map) for k, v in t.items()}
+        return TypeTerm.from_typing(t, tv_map)
+
+    # on-disk index
+    def _read_index(self):
+        try:
+            with open(self.index_file, "rb") as f:
+                index = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if (
+            index.get("format") != INDEX_FORMAT
+            or index.get("target") != self._target()
+            or index.get("revision") != typeshed_revision()
+        ):
+            return None
+        return index
+
+    def _ensure_index(self):
+        if self.index is not None:
+            return
+        with self.lock:
+            if self.index is not None:
+                return
+            index = self._read_index()
+            if index is None:
+                self.index = {}
+            else:
+                if self.paths is None:
+                    paths = TypeshedIndex(index["paths"], index["dirs"])
+                    if paths.is_current(): # else rescanned by typeshed_index()
+                        self.paths = paths
+                self.index = index["entries"]
+
+    def typeshed_index(self):
+        self._ensure_index()
+        if self.paths is None:
+            with self.lock:
+                if self.paths is None:
+                    self.paths = TypeshedIndex.scan()
+        return self.paths
+
+    def _load_indexed(self, file_name):
+        self._ensure_index()
+        try:
+            digest, symbols = self.index[self._index_name(file_name)]
+        except KeyError:
+            return None
+        try:
+            with open(file_name, "rb") as f:
+                if hashlib.sha1(f.read()).hexdigest() != digest:
+                    return None
+        except OSError: # removed since the trie was made
+            self.invalidate_paths()
+            return None
+        return LazyStub(pickled=symbols)
+
+    def invalidate_paths(self):
+        """Rescan typeshed at the next typeshed_index(), its files changed."""
+        with self.lock:
+            self.paths = None
+
+    def build_index(self):
+        paths = TypeshedIndex.scan()
+        entries = {}
+        for root, _, files in os.walk(STDLIB_DIR):
+            for name in files:
+                if not name.endswith(".pyi"):
+                    continue
+                file_name = os.path.join(root, name)
+                with open(file_name, "rb") as f:
+                    source = f.read()
+                try:
+                    symbols = _pickle_symbols(LazyStub.from_source(source))
+                except Exception:
+                    continue  # left to fail at lookup time, as without an index
+                entries[self._index_name(file_name)] = (
+                    hashlib.sha1(source).hexdigest(),
+                    symbols,
+                )
+        index = {
+            "format": INDEX_FORMAT,
+            "revision": typeshed_revision(),
+            "target": self._target(),
+            "paths": paths.roots,
+            "dirs": paths.dirs,
+            "entries": entries,
+        }
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.index_file)
+        self.index = entries
+        self.paths = paths
+        return len(entries)
+
+    # warm-up
+    def warm(self, module_names=WARM_MODULES, max_workers=None):
+        """Convert the stubs of module_names in a process pool.
+
+        Stubs already in memory or in the on-disk index are skipped. Returns
+        the number of stubs added to the cache.
+        """
+        paths = self.typeshed_index()
+        file_names = {}
+        for module_name in module_names:
+            try:
+                found, _ = paths.find(module_name.split("."))
+            except Exception:
+                continue
+            for fn in found:
+                key = self._key(fn)
+                if not fn.endswith(".pyi") or key in self.templates:
+                    continue
+                template = self._load_indexed(fn)
+                if template is not None:
+                    self.templates.setdefault(key, template)
+                    self.index_hits += 1
+                else:
+                    file_names[key] = fn
+        if not file_names:
+            return 0
+        count = 0
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = executor.map(_convert_stub, file_names.values())
+            for key, symbols in zip(file_names, results):
+                if symbols is None:
+                    continue  # left to fail at lookup time, as without warm-up
+                with self._lock_for(key):
+                    if key in self.templates:
+                        continue
+                    self.templates[key] = LazyStub(pickled=symbols)
+                self.misses += 1
+                count += 1
+        return count
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "index_hits": self.index_hits,
+            "misses": self.misses,
+            "files": len(self.templates),
+        }
+
+    def clear(self):
+        with self.lock:
+            self.templates.clear()
+            self.locks.clear()
+            self.index = None
+            self.paths = None
+        self.hits = 0
+        self.index_hits = 0
+        self.misses = 0
+        Seeker.clear()  # its modules and builtins are views of the templates
+
+
+stub_cache = StubCache()
+
+
+def _pickle_symbols(stub):
+    """Convert every symbol of a LazyStub, pickled one by one."""
+    symbols = {}
+    for key in stub:
+        try:
+            value = stub[key]
+        except Exception:
+            continue
+        buf = io.BytesIO()
+        _StubPickler(buf, pickle.HIGHEST_PROTOCOL).dump(value)
+        symbols[key] = buf.getvalue()
+    return symbols
+
+
+def _convert_stub(file_name):
+    # process pool worker of StubCache.warm()
+    try:
+        with open(file_name, "rb") as f:
+            return _pickle_symbols(LazyStub.from_source(f.read()))
+    except Exception:
+        return None
+
+
+class Typer:
+    def __init__(self):
+        self.storage = {}
 
     @staticmethod
     def _find_file(module_name):
-        pkg_dir = os.path.dirname(os.path.abspath(__file__))
-        dirs = ["3.7", "3.6", "3", "2and3", "2"]
-        for d in dirs:
-            file_names, remain_len, found = Typer._recursive_find_file(
-                f"{pkg_dir}/typeshed/stdlib/{d}", module_name
-            )
-            if found:
-                break
-        if not found:
-            raise Exception(f"{module_name} not found in typeshed")
-        return file_names, remain_len
+        return stub_cache.typeshed_index().find(module_name)
 
-    def _record_type(self, splitted_name):
+    def _record_type(self, splitted_name, rescan=True):
         file_names, remain_len = Typer._find_file(splitted_name)
-        for fn in file_names:
-            with open(fn) as f:
-                parsed_ast = ast.parse(f.read())
-            v = Visitor()
-            v.visit(parsed_ast)
-            cur = self.storage
-            if remain_len == 0:
-                tmp_splitted_name = splitted_name
-            else:
-                tmp_splitted_name = splitted_name[:-remain_len]
-            for i in tmp_splitted_name:
-                if i not in cur:
-                    cur[i] = {}
-                cur = cur[i]
-            if len(file_names) > 1 and "__init__.pyi" not in fn:
-                cur[fn.split(os.sep)[-1].replace(".pyi", "")] = {}
-                cur = cur[fn.split(os.sep)[-1].replace(".pyi", "")]
-            for key, val in v.storage.items():
-                cur[key] = val
-
-    def _get_type(self, splitted_name):
+        if remain_len == 0:
+            module_name = splitted_name
+        else:
+            module_name = splitted_name[:-remain_len]
+        # definitions are only converted once looked up
+        try:
+            module = stub_cache.load_module(file_names)
+        except OSError: # the stub was removed since typeshed was scanned
+            if not rescan:
+                raise
+            stub_cache.invalidate_paths()
+            return self._record_type(splitted_name, rescan=False)
         cur = self.storage
-        for i in splitted_name:
+        for i in module_name[:-1]:
+            if i not in cur:
+                cur[i] = {}
             cur = cur[i]
-        return cur
+        cur[module_name[-1]] = module
+        return module, splitted_name[len(module_name):]
 
     def get_type(self, name):
         splitted_name = name.split(".")
         if splitted_name[0] in dir(builtins):
             splitted_name = ["builtins"] + splitted_name
-        # try:
-        #     return self._get_type(splitted_name)
-        # except KeyError:
-        self._record_type(splitted_name)
-        return self._get_type(splitted_name)
+        # walk from the module just recorded, not from self.storage, which
+        # another thread may have re-recorded meanwhile
+        cur, attrs = self._record_type(splitted_name)
+        for i in attrs:
+            cur = cur[i]
+        return cur
 
 
 class Seeker(Typer):
-    def _record_symtable(self, symtable, module, module_name):
-        for k, v in module.items():
-            # submodule or class
-            if isinstance(v, dict):
-                submodule_name = f"{k}"
-                submodule_symtable = SymTable.SymTable(submodule_name, parent=symtable)
-                self._record_symtable(submodule_symtable, v, submodule_name)
-                symtable.add(submodule_name, submodule_symtable)
-            else:
-                symtable.add(k, TypeWrapper(v, need_refresh=True))
-
-    def get_module_symtable(self, module_name):
-        module_symtable = SymTable.SymTable(module_name)
-        module = self.get_type(module_name)
-        self._record_symtable(module_symtable, module, module_name)
-        return module_symtable
+    builtins = None
+    builtins_symtable = None
+    modules = {}
+
+    @classmethod
+    def clear(cls):
+        cls.builtins = None
+        cls.builtins_symtable = None
+        cls.modules.clear()
+
+    def get_module_symtable(self, module_name, targets=None):
+        # repeated imports fork the interned module, so every importer gets
+        # its own type variables without resolving the module again
+        try:
+            module = Seeker.modules[module_name].fork()
+        except KeyError:
+            module = self.get_type(module_name)
+            if isinstance(module, LazyModule):
+                module = Seeker.modules.setdefault(module_name, module).fork()
+        if targets is not None:  # from ... import: only convert what is used
+            module = {k: module[k] for k in targets if k in module}
+        return SymTable.LazySymTable(module_name, module)
+
+    def _get_builtins_template(self):
+        if Seeker.builtins is None:
+            file_names, _ = Typer._find_file(["builtins"])
+            Seeker.builtins_symtable = SymTable.SymTable("builtins")
+            Seeker.builtins = stub_cache.template(file_names[0])
+        return Seeker.builtins
 
     def get_builtins_obj(self, target):
-        builtins_symtable = self.get_module_symtable("builtins")
-        return builtins_symtable.get(target)
-
+        # instantiate only the requested entry of the shared builtins stub,
+        # None if there is none
+        template = self._get_builtins_template()
+        if target not in template:
+            return None
+        entry = template[target]
+        if isinstance(entry, dict):  # class, members are instantiated once used
+            # a child of builtins for lookups, but not registered in its
+            # childs: every use gets a table of its own
+            table = SymTable.LazySymTable(target, LazyModule(entry))
+            table.parent = Seeker.builtins_symtable
+            return table
+        return TypeWrapper(StubCache.instantiate(entry, {}), need_refresh=True)
+
+
+# imported last: SymTable needs Seeker at import time
+from . import SymTable
 
 if __name__ == "__main__":
     x = Seeker()
@@ -0,0 +1,8 @@
+a = 1
+b = a - "s"  # --diagnostics: 2:5: BinOp failed
+c = undefined  # --diagnostics: 3:5: undefined not found
+for i in a:  # i: Any, int has no __iter__
+    d = i
+
+def f(x):
+    return x.y  # --diagnostics: 8:12: typing.Any has no attribute y
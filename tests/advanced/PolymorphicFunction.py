@@ -0,0 +1,10 @@
+def identity(x):  # identity(x: Union[int, str]) -> Union[int, str], joined over its calls
+    return x
+
+def first(a, b):  # first(a: Union[float, str], b: Union[str, int]) -> Union[float, str]
+    return a
+
+a = identity(1)  # a: int
+b = identity("s")  # b: str
+c = first(1.5, "s")  # c: float
+d = first("s", 1)  # d: str
@@ -0,0 +1,14 @@
+class K():
+    def m(self, x):  # m(self, x: int) -> int
+        def unused(a):  # unused(a: Any) -> Any
+            return a
+        y = x - "s"  # --diagnostics: BinOp failed
+        return x
+
+def f(n):  # f(n: int) -> int
+    if n == 0:
+        return 1
+    K().m(n)
+    return f(n - 1)
+
+f(3)
@@ -0,0 +1,17 @@
+def countdown(n):  # countdown(n: int) -> int
+    if n == 0:
+        return 0
+    return countdown(n - 1)
+
+def even(n):  # even(n: int) -> bool
+    if n == 0:
+        return True
+    return odd(n - 1)
+
+def odd(n):  # odd(n: int) -> bool
+    if n == 0:
+        return False
+    return even(n - 1)
+
+a = countdown(10)
+b = even(3)
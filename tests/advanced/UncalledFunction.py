@@ -0,0 +1,14 @@
+def never_called(a, b):  # never_called(a: Any, b: Any) -> Any
+    def nested():  # nested() -> int
+        return 1
+    return a
+
+class A():
+    def method(self, x):  # method(self, x: int) -> int
+        return x + 1
+
+def returns_unknown(a):  # returns_unknown(a: Any) -> Any, returns a value it can't infer
+    return 1 - "s"
+
+def returns_nothing():  # returns_nothing() -> None
+    print("s")
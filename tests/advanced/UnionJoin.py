@@ -0,0 +1,14 @@
+def flag(a):  # flag(a: Any) -> int, bool is absorbed by int
+    if a:
+        return True
+    return 1
+
+def pick(a):  # pick(a: Any) -> Union[int, str, float]; --union-width 2: pick(a: Any) -> object
+    if a:
+        return 1
+    if a:
+        return "s"
+    return 1.5
+
+x = [1, True]  # x: List[int]
+y = [1, "s", 1.5]  # y: List[Union[int, str, float]]; --union-width 2: y: List[object]
@@ -0,0 +1,7 @@
+class A():
+    def m(self, x):
+        def inner(a, b):
+            return a
+        return inner(x, "s")
+
+c = A().m(1)
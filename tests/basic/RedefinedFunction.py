@@ -0,0 +1,7 @@
+def f(x=1):  # f(x: int=1) -> str
+    return "s"
+
+def f(x=1):  # f(x: int=1) -> int
+    return 1
+
+a = f()  # a: int
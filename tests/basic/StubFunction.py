@@ -0,0 +1,7 @@
+import re
+from os.path import join
+
+a = join("a", "b")  # a: not annotated, the stub's last overload takes bytes
+e = re.escape("a")  # e: str
+f = re.escape(b"a")  # f: bytes
+g = re.escape(1)  # g: not annotated, AnyStr is str or bytes